@@ -2,33 +2,69 @@ import discord
 from discord import app_commands, Guild, CategoryChannel, TextChannel, VoiceChannel, Embed
 from discord.ext import commands, tasks
 import asyncio
+import copy
+import os
+import time
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
 
 from datetime import datetime, timezone, timedelta
 from loguru import logger
-from typing import Optional
+from typing import Any, Optional
 
 from ui.interaction_ui import *
 from utils.embed_template import *
-from utils.rw_pvch_data import PvchDataCsv
+from utils.guild_config import GuildConfig, load_guild_configs
+from utils.guild_partition import GuildPartition
+from utils.expiry_scheduler import ExpiryScheduler
+from utils.expiry_sweep import run_sweep
+from utils.channel_archive import ArchiveInfo, ChannelArchiver, format_size
+from utils.reconcile import ReconcileReport, reconcile
+from utils.command_sync import sync_command_tree
+from utils.cog_reload import reload_extension
+from utils.pvch_store import store_settings
+from utils.rest_queue import Priority, rest_queue
+from utils.metrics import metrics
 
 from settings import *
 
-pvch_data_csv: PvchDataCsv = PvchDataCsv()
+partitions: dict[int, GuildPartition] = {}  # {guild_id: GuildPartition} of the guilds served by this process
 
 class PrivateChannel:
-    def __init__(self, user_id: int, txt_channel: TextChannel, vc_channel: VoiceChannel):
+    __slots__ = ("user_id", "txt_channel", "vc_channel", "guests")
+
+    def __init__(self, user_id: int, txt_channel: TextChannel, vc_channel: VoiceChannel, guests: Optional[set[int]] = None):
         self.user_id: int = user_id
         self.txt_channel: TextChannel = txt_channel
         self.vc_channel: VoiceChannel = vc_channel
+        self.guests: set[int] = guests if guests is not None else self.guests_from_overwrites()
 
     def __str__(self) -> str:
         return f"PrivateChannel(user_id={self.user_id}, text_channel={self.txt_channel}, voice_channel={self.vc_channel})"
 
+    @property
+    def partition(self) -> GuildPartition:
+        return partitions[self.txt_channel.guild.id]
+
+    def guests_from_overwrites(self) -> set[int]:
+        """Collect invited members from the text channel's member overwrites"""
+        guests: set[int] = set()
+        for target, overwrite in self.txt_channel.overwrites.items():
+            if isinstance(target, discord.Role) or (isinstance(target, discord.Object) and target.type is discord.Role):
+                continue
+            if target.id != self.user_id and overwrite.view_channel:
+                guests.add(target.id)
+        return guests
+
     async def send_welcome_message(self):
         """Send a Welcome message to the private channel you created"""
         try:
-            sent_message = await self.txt_channel.send(embed=welcome_embed_template())
-            await sent_message.pin()
+            config: GuildConfig = self.partition.config
+            sent_message: discord.Message = await rest_queue.send(self.txt_channel, embed=welcome_embed_template(config.inactive_days, config.inactive_sb_days,
+                                                                                                                self.partition.guild_name))
+            await rest_queue.pin(sent_message)
         except discord.HTTPException:
             logger.error("Failed to send message to private channel.")
 
@@ -36,48 +72,51 @@ class PrivateChannel:
         """Delete private channel"""
         try:
             if ctx.channel.id == self.txt_channel.id:  # In my private channel
-                await self.txt_channel.send(embed=info_embed_template(f"約5秒後に、プライベートチャンネルを削除します。"))
+                await rest_queue.send(self.txt_channel, embed=info_embed_template(f"約5秒後に、プライベートチャンネルを削除します。"))
 
                 await asyncio.sleep(5.0)
-                await self.txt_channel.delete()
-                await self.vc_channel.delete()
+                await rest_queue.delete(self.txt_channel)
+                await rest_queue.delete(self.vc_channel)
             else: # In public channel
-                await self.txt_channel.delete()
-                await self.vc_channel.delete()
+                await rest_queue.delete(self.txt_channel)
+                await rest_queue.delete(self.vc_channel)
                 await ctx.followup.send(embed=success_embed_template("あなたのプライベートチャンネルを削除しました。"), ephemeral=True)
-            del pvch_data[self.user_id]
-            pvch_data_csv.update(pvch_data)
+            self.partition.unregister(self.user_id, self)
         except (discord.NotFound, discord.HTTPException):
             logger.error("Failed to delete private channel.")
             await ctx.followup.send(embed=error_embed_template("プライベートチャンネルの削除に失敗しました。"), ephemeral=True)
 
-    async def force_delete(self):
+    async def force_delete(self, priority: Priority = Priority.USER) -> bool:
         """Forced deletion (automatic deletion or deletion by authority)"""
         try:
-            await self.txt_channel.delete()
-            await self.vc_channel.delete()
-            del pvch_data[self.user_id]
-            pvch_data_csv.update(pvch_data)
+            await rest_queue.delete(self.txt_channel, priority)
+            await rest_queue.delete(self.vc_channel, priority)
+            self.partition.unregister(self.user_id, self)
+            return True
         except (discord.NotFound, discord.HTTPException):
             logger.error("Failed to delete private channel.")
+            return False
 
     async def invite_user(self, users: list[discord.Member]) -> Embed:
         """User Invitation"""
         success_users: list[str] = []
         failed_users: list[str] = []
         ignore_users: list[str] = []
+        targets: list[discord.Member] = []
 
         for user in users:
-            if user.top_role.id in [MODERATOR_ROLE_ID, OWNER_ROLE_ID] or user.id == self.user_id or user.bot:
+            if self.partition.is_staff(user) or user.id == self.user_id or user.bot:
                 ignore_users.append(user.name)
                 continue
 
+            targets.append(user)
+
+        if len(targets) > 0:
             try:
-                await self.txt_channel.set_permissions(user, view_channel=True)
-                await self.vc_channel.set_permissions(user, view_channel=True)
-                success_users.append(user.display_name)
+                await self.grant(targets)
+                success_users = [user.display_name for user in targets]
             except discord.HTTPException:
-                failed_users.append(user.display_name)
+                failed_users = [user.display_name for user in targets]
 
         embed: Embed = invite_embed_template()
         if len(success_users) > 0:
@@ -86,25 +125,31 @@ class PrivateChannel:
             embed.add_field(name="失敗", value="- "+"\n- ".join(filter(None, failed_users)), inline=False)
         if len(ignore_users) > 0:
             embed.add_field(name="無効", value="- "+"\n- ".join(filter(None, ignore_users)), inline=False)
-        await self.txt_channel.send(embed=embed)
+        try:
+            await rest_queue.send(self.txt_channel, embed=embed)
+        except discord.HTTPException:  # e.g. the channel was deleted meanwhile
+            logger.error("Failed to send message to private channel.")
 
     async def kick_user(self, users: list[discord.Member]) -> Embed:
         """User Kick"""
         success_users: list[str] = []
         failed_users: list[str] = []
         ignore_users: list[str] = []
+        targets: list[discord.Member] = []
 
         for user in users:
-            if user.top_role.id in [MODERATOR_ROLE_ID, OWNER_ROLE_ID] or user.id == self.user_id or user.bot:
+            if self.partition.is_staff(user) or user.id == self.user_id or user.bot:
                 ignore_users.append(user.name)
                 continue
 
+            targets.append(user)
+
+        if len(targets) > 0:
             try:
-                await self.txt_channel.set_permissions(user, overwrite=None)
-                await self.vc_channel.set_permissions(user, view_channel=False)
-                success_users.append(user.display_name)
+                await self.revoke(targets)
+                success_users = [user.display_name for user in targets]
             except discord.HTTPException:
-                failed_users.append(user.display_name)
+                failed_users = [user.display_name for user in targets]
 
         embed: Embed = kick_embed_template()
         if len(success_users) > 0:
@@ -113,15 +158,68 @@ class PrivateChannel:
             embed.add_field(name="失敗", value="- "+"\n- ".join(filter(None, failed_users)), inline=False)
         if len(ignore_users) > 0:
             embed.add_field(name="無効", value="- "+"\n- ".join(filter(None, ignore_users)), inline=False)
-        await self.txt_channel.send(embed=embed)
+        try:
+            await rest_queue.send(self.txt_channel, embed=embed)
+        except discord.HTTPException:  # e.g. the channel was deleted meanwhile
+            logger.error("Failed to send message to private channel.")
+
+    async def grant(self, users: list[discord.abc.User]):
+        """Let users see the private channel (one channel edit per channel)"""
+        allow: discord.PermissionOverwrite = discord.PermissionOverwrite(view_channel=True)
+        await self._edit_overwrites({user: allow for user in users}, {user: allow for user in users})
+        part: GuildPartition = self.partition
+        for user in users:
+            part.registry.add_guest(self, user.id)
+        if part.registry.get(self.user_id) is self:  # Not deleted while the edit was in flight
+            part.pvch_data_csv.write(self)
+
+    async def revoke(self, users: list[discord.abc.User]):
+        """Remove users from the private channel (one channel edit per channel)"""
+        deny: discord.PermissionOverwrite = discord.PermissionOverwrite(view_channel=False)
+        await self._edit_overwrites({user: None for user in users}, {user: deny for user in users})
+        part: GuildPartition = self.partition
+        for user in users:
+            part.registry.remove_guest(self, user.id)
+        if part.registry.get(self.user_id) is self:  # Not deleted while the edit was in flight
+            part.pvch_data_csv.write(self)
+
+    async def _edit_overwrites(self, txt_updates: dict[discord.abc.User, Optional[discord.PermissionOverwrite]],
+                               vc_updates: dict[discord.abc.User, Optional[discord.PermissionOverwrite]]):
+        """Apply member overwrite changes (None removes the overwrite) to both channels concurrently"""
+        results: list = await asyncio.gather(*[rest_queue.submit(lambda attr=attr, updates=updates: self._apply_overwrites(attr, updates),
+                                                                 bucket=getattr(self, attr).id, route="channel.edit")
+                                               for attr, updates in (("txt_channel", txt_updates), ("vc_channel", vc_updates))],
+                                             return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _apply_overwrites(self, attr: str, updates: dict[discord.abc.User, Optional[discord.PermissionOverwrite]]):
+        """Edit one of the channels when the queued job runs
+
+        The map is merged into the newest overwrites known at that point: those returned by the previous edit,
+        which the cached channel only reflects once the gateway update arrives, or a later change made outside the bot.
+        Edits of the same channel run one at a time (its REST queue bucket), so they do not overwrite each other.
+        """
+        channel: discord.abc.GuildChannel = getattr(self, attr)
+        edited: Optional[discord.abc.GuildChannel] = await self.partition.channel_edits.edit(channel, overwrites=self._merge_overwrites(channel, updates))
+        if edited is not None:
+            setattr(self, attr, edited)
+
+    @staticmethod
+    def _merge_overwrites(channel: discord.abc.GuildChannel, updates: dict[discord.abc.User, Optional[discord.PermissionOverwrite]]) -> dict:
+        """Compute the final overwrite map of a channel"""
+        merged: dict[int, tuple] = {target.id: (target, overwrite) for target, overwrite in channel.overwrites.items()}  # Keyed by id, cached or not
+        for target, overwrite in updates.items():
+            if overwrite is None:
+                merged.pop(target.id, None)
+            else:
+                merged[target.id] = (target, overwrite)
+        return dict(merged.values())
 
     async def is_expired(self, inactive: int) -> bool:
         """Check if private channel is expired"""
-        last_active_datetime: datetime = self.txt_channel.created_at.astimezone(timezone(timedelta(hours=9)))
-        last_msg: discord.Message = [message async for message in self.txt_channel.history(limit=1)]
-        if len(last_msg) > 0:
-            last_active_datetime = last_msg[0].created_at
-        last_active_datetime = last_active_datetime.astimezone(timezone(timedelta(hours=9)))
+        last_active_datetime: datetime = datetime.fromtimestamp(await self.partition.activity_tracker.last_active(self), timezone(timedelta(hours=9)))
         now: datetime = datetime.now().astimezone(timezone(timedelta(hours=9)))
 
         exp: datetime = last_active_datetime + timedelta(days=inactive)
@@ -130,30 +228,265 @@ class PrivateChannel:
         return False
 
 
-pvch_data: dict[int, PrivateChannel] = {}  # {user_id: PrivateChannel}
-
 class PrivateChannelBot(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        self.ready: bool = False
+        self.load_started: float = time.perf_counter()
+        self.guild_configs: dict[int, GuildConfig] = {}
+        self.background_tasks: set[asyncio.Task] = set()
+        self.creating: set[tuple[int, int]] = set()  # (guild_id, owner) whose /pvch_create is in flight
+        self.archiver: ChannelArchiver = ChannelArchiver()
+        self.handing_off: bool = False  # Unloaded for a reload, the state goes to the next cog instance
+        self.handoff_seconds: Optional[float] = None
+
+        metrics.gauge("pvch_guilds", lambda: len(partitions), "Guilds served by this process")
+        metrics.gauge("pvch_registry_size", lambda: sum(len(part.registry) for part in partitions.values()), "Registered private channels")
+        metrics.gauge("pvch_scheduled_expiries", lambda: sum(len(part.expiry_scheduler) for part in partitions.values()),
+                      "Private channels with a scheduled expiry deadline")
+        metrics.gauge("pvch_pool_size", lambda: sum(len(part.channel_pool) for part in partitions.values()), "Pooled private channel pairs")
+        metrics.gauge("pvch_store_pending_writes", lambda: sum(part.pvch_data_csv.pending_writes() for part in partitions.values()),
+                      "Private channel changes not written to the store yet")
+        for priority in Priority:
+            metrics.gauge(f"pvch_rest_queue_depth_{priority.name.lower()}", lambda priority=priority: rest_queue.stats[priority].depth)
+
+    async def cog_load(self):
+        self.bot.add_dynamic_items(*DYNAMIC_ITEMS)
+        if (handoff := getattr(self.bot, "pvch_handoff", None)) is not None:  # Reloaded, on_ready will not fire again
+            del self.bot.pvch_handoff
+            await self.take_over(handoff)
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(*DYNAMIC_ITEMS)
+        if self.handing_off:
+            await self.hand_off()
+            return
+        for part in partitions.values():
+            part.stop()
+        rest_queue.stop()
+        await metrics.stop()
+        self.compact_pvch_data.cancel()
+        for part in list(partitions.values()):
+            part.activity_tracker.flush()
+            await asyncio.to_thread(part.pvch_data_csv.close)  # Writes the changes still queued
+        partitions.clear()
+
+    async def hand_off(self):
+        """Stop the background work and leave the state on the bot for the reloaded cog"""
+        started: float = time.perf_counter()
+        for part in partitions.values():
+            part.stop()
+        self.compact_pvch_data.cancel()
+        # Let in-flight commands finish against this instance's state before it is exported
+        deadline: float = started + PVCH_RELOAD_DRAIN_TIMEOUT
+        while (self.creating or self.background_tasks or rest_queue.busy) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        rest_queue.stop()
+        await metrics.stop()
+        self.bot.pvch_handoff = {"started": started, "store_settings": store_settings(), "metrics": (metrics.counters, metrics.histograms),
+                                 "guild_configs": [{attr: getattr(config, attr) for attr in GuildConfig.__slots__} for config in self.guild_configs.values()],
+                                 "partitions": {guild_id: part.export_state() for guild_id, part in partitions.items()}}
+        partitions.clear()
+
+    async def take_over(self, handoff: dict[str, Any]):
+        """Continue from the state handed off by the previous cog instance
+
+        If this fails, the state is put back so the previous code, which discord.py sets up again, can take it over.
+        """
+        try:
+            await self._take_over(handoff)
+        except BaseException:
+            for part in partitions.values():
+                part.stop()
+            partitions.clear()
+            self.bot.pvch_handoff = handoff
+            raise
+
+    async def _take_over(self, handoff: dict[str, Any]):
+        self.ready = True
+        try:
+            self.guild_configs = load_guild_configs()
+        except (OSError, ValueError):
+            logger.exception("Failed to read the guild configs, keeping the previous ones.")
+            self.guild_configs = {entry["guild_id"]: GuildConfig(**entry) for entry in handoff["guild_configs"]}
+        metrics.counters, metrics.histograms = handoff["metrics"]
+        same_store: bool = handoff["store_settings"] == store_settings()
+        for guild_id, state in handoff["partitions"].items():
+            config: Optional[GuildConfig] = self.guild_configs.get(guild_id)
+            guild: Optional[Guild] = self.bot.get_guild(guild_id)
+            part: Optional[GuildPartition] = None
+            if config is not None and guild is not None:
+                part = GuildPartition(config, state["store"] if same_store else None)
+            if part is None or not part.attach(guild):
+                logger.info(f"Guild {guild_id} is no longer served.")
+                await asyncio.to_thread(state["store"].close)
+                if part is not None:
+                    part.pvch_data_csv.close()
+                continue
+            if not same_store:  # Write the queued changes, then copy the records to the newly configured store
+                await asyncio.to_thread(state["store"].close)
+            part.restore(state, copy_records=not same_store)
+            partitions[guild_id] = part
+            part.expiry_scheduler.start(lambda user_ids, part=part: self.check_pv_exp(part, user_ids))
+            part.channel_pool.start(part.category_allocator, part.registry)
+        for config in self.guild_configs.values():  # Added to the config file
+            if config.guild_id not in partitions and (guild := self.bot.get_guild(config.guild_id)) is not None:
+                await self.start_partition(config, guild, {})
+
+        self.handoff_seconds = time.perf_counter() - handoff["started"]
+        logger.info(f"Took over the state of the previous cog in {self.handoff_seconds:.3f}s: guilds={len(partitions)}, "
+                    f"private_channels={sum(len(part.registry) for part in partitions.values())}, same_store={same_store}")
+        self.compact_pvch_data.start()
+        await metrics.start()
+        try:
+            await sync_command_tree(self.bot.tree)  # Only when the reloaded commands changed
+        except discord.HTTPException:
+            logger.error("Failed to sync command tree.")
 
     @commands.Cog.listener()
     async def on_ready(self):
+        # on_ready fires again after every gateway reconnect, only refresh cached objects then
+        if self.ready:
+            logger.info("Reconnected.")
+            for part in partitions.values():
+                if (guild := self.bot.get_guild(part.guild_id)) is not None and not part.refresh(guild):
+                    logger.error(f"Private channel category {part.config.category_id} not found in guild {guild.id}.")
+            await self.bot.change_presence(activity=discord.Game("running..."))
+            return
+        self.ready = True
+
         logger.info("Login successful.")
-        self.guild: Guild = self.bot.get_guild(GUILD_ID)
-        self.category: CategoryChannel = self.guild.get_channel(CATEGORY_ID)
-        await self.bot.tree.sync()
+        timing: dict[str, float] = {"cache_ready": time.perf_counter() - self.load_started, "state_load": 0.0, "reconciliation": 0.0}
+        self.guild_configs = load_guild_configs()
 
-        # PrivateChannel CSV read
-        global pvch_data
+        phase_started: float = time.perf_counter()
         try:
-            pvch_data = pvch_data_csv.read(self.category)
-        except FileNotFoundError:
-            pass
+            await sync_command_tree(self.bot.tree)
+        except discord.HTTPException:
+            logger.error("Failed to sync command tree.")
+        timing["sync"] = time.perf_counter() - phase_started
 
-        self.check_pv_exp.start()
+        # Guilds on shards run by other processes are not cached here, those processes serve them
+        for config in self.guild_configs.values():
+            if (guild := self.bot.get_guild(config.guild_id)) is not None:
+                await self.start_partition(config, guild, timing)
+
+        startup_log: str = "Startup timing: " + ", ".join(f"{phase}={elapsed:.3f}s" for phase, elapsed in timing.items())
+        if resource is not None:
+            startup_log += f", max_rss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MiB"
+        logger.info(f"{startup_log}, guilds={len(partitions)}/{len(self.guild_configs)}, shards={self.bot.shard_count}, low_memory_mode={LOW_MEMORY_MODE}")
+
+        self.compact_pvch_data.start()
+        await metrics.start()
         await self.bot.change_presence(activity=discord.Game("running..."))
 
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: Guild):
+        """Start serving a configured guild the bot was added to after startup"""
+        if self.ready and (config := self.guild_configs.get(guild.id)) is not None and guild.id not in partitions:
+            await self.start_partition(config, guild, {})
+
+    async def start_partition(self, config: GuildConfig, guild: Guild, timing: dict[str, float]):
+        """Load the private channels of a guild, schedule their expiry and reconcile them with the guild"""
+        phase_started: float = time.perf_counter()
+        part: GuildPartition = GuildPartition(config)
+        if not part.attach(guild):
+            logger.error(f"Private channel category {config.category_id} not found in guild {guild.id}.")
+            part.pvch_data_csv.close()
+            return
+        part.load()
+        partitions[guild.id] = part
+
+        for user_id in part.registry:
+            part.schedule_expiry(user_id)
+        part.expiry_scheduler.start(lambda user_ids, part=part: self.check_pv_exp(part, user_ids))
+        part.channel_pool.start(part.category_allocator, part.registry)
+        timing["state_load"] = timing.get("state_load", 0.0) + time.perf_counter() - phase_started
+
+        phase_started = time.perf_counter()
+        report: ReconcileReport = await reconcile(part.pvch_data_csv, part.registry, part.category_allocator.categories(), part.channel_pool.is_pool_channel,
+                                                  PVCH_RECONCILE_DELETE_ORPHANS, PVCH_RECONCILE_CONCURRENCY)
+        timing["reconciliation"] = timing.get("reconciliation", 0.0) + time.perf_counter() - phase_started
+        logger.info(f"Reconciliation of guild {guild.id}: {report}")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Drop the registry entry of a private channel deleted by hand"""
+        if (part := partitions.get(channel.guild.id)) is None:
+            return
+        part.channel_edits.forget(channel.id)
+        if isinstance(channel, CategoryChannel):
+            part.category_allocator.forget(channel.id)
+            return
+        if part.in_pvch_category(channel):
+            self.run_in_background(part.category_allocator.remove_empty())
+        part.channel_pool.discard(channel.id)
+        pvch: Optional[PrivateChannel] = part.registry.get_by_channel(channel.id)
+        if pvch is None:
+            return
+        part.unregister(pvch.user_id, pvch)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        """Keep the private channel objects and the guest list in sync with changes made outside the bot"""
+        if (part := partitions.get(after.guild.id)) is None or not part.in_pvch_category(after):
+            return
+        if not part.channel_edits.is_current(after):  # Echo of an older edit, the private channel holds a newer object
+            return
+        if (pvch := part.registry.get_by_channel(after.id)) is None:
+            return
+        # A copy, the cached object is changed in place by every later update, echoes of older edits included
+        if after.id == pvch.txt_channel.id:
+            pvch.txt_channel = copy.copy(after)
+            if part.registry.sync_guests(pvch):
+                part.pvch_data_csv.write(pvch)
+        else:
+            pvch.vc_channel = copy.copy(after)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Track text activity in private channels"""
+        if message.guild is None or (part := partitions.get(message.guild.id)) is None or not part.in_pvch_category(message.channel):
+            return
+        if (pvch := part.registry.get_by_txt(message.channel.id)) is not None:
+            part.activity_tracker.touch(pvch.user_id, message.created_at.timestamp())
+            part.schedule_expiry(pvch.user_id)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        """Track voice activity in private channels"""
+        if (part := partitions.get(member.guild.id)) is None:
+            return
+        for channel in (before.channel, after.channel):
+            if channel is None or not part.in_pvch_category(channel):
+                continue
+            if (pvch := part.registry.get_by_vc(channel.id)) is not None:
+                part.activity_tracker.touch(pvch.user_id)
+                part.schedule_expiry(pvch.user_id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """Re-key the expiry deadline when the owner's booster status changes"""
+        if before.premium_since != after.premium_since and (part := partitions.get(after.guild.id)) is not None and after.id in part.registry:
+            part.schedule_expiry(after.id)
+
+    async def interaction_check(self, ctx: discord.Interaction) -> bool:
+        ctx.extras["started"] = time.perf_counter()
+        if ctx.guild_id not in partitions:  # Not configured, or served by another process
+            await ctx.response.send_message(embed=error_embed_template("このサーバーではプライベートチャンネルを利用できません。"), ephemeral=True)
+            return False
+        return True
+
+    def observe_command(self, ctx: discord.Interaction, outcome: str):
+        if (started := ctx.extras.get("started")) is not None and ctx.command is not None:
+            metrics.observe("pvch_command_seconds", time.perf_counter() - started, command=ctx.command.name, outcome=outcome)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, ctx: discord.Interaction, command: app_commands.Command):
+        self.observe_command(ctx, "success")
+
     async def cog_app_command_error(self, ctx: discord.Interaction, error: app_commands.AppCommandError):
+        self.observe_command(ctx, "error")
         if isinstance(error, app_commands.CommandOnCooldown):  # Cooldown error message
             await ctx.response.send_message(f"クールダウン中...\n`{str(error)}`", ephemeral=True)
 
@@ -162,7 +495,7 @@ class PrivateChannelBot(commands.Cog):
     async def pvch_help(self, ctx: discord.Interaction):
         """Display command help"""
         embed: Embed = Embed(title="コマンドヘルプ", color=0x979c9f)
-        for cmd in self.bot.tree.walk_commands(guild=self.guild):
+        for cmd in self.bot.tree.walk_commands(guild=ctx.guild):
             embed.add_field(name=f"`/{cmd.name}`", value=cmd.description, inline=False)
         await ctx.response.send_message(embed=embed, ephemeral=True)
 
@@ -170,71 +503,88 @@ class PrivateChannelBot(commands.Cog):
     @app_commands.checks.cooldown(3, 20.0, key=lambda i: (i.guild_id, i.user.id))
     async def pvch_info(self, ctx: discord.Interaction):
         """Private channel information display"""
-        if ctx.channel.category_id != CATEGORY_ID:
+        part: GuildPartition = partitions[ctx.guild_id]
+        if not part.in_pvch_category(ctx.channel):
             await ctx.response.send_message(embed=error_embed_template("このコマンドはプライベートチャンネルでのみ使用できます。"), ephemeral=True)
             return
 
-        pvch: PrivateChannel = None
-        for p in pvch_data.values():
-            if p.txt_channel.id == ctx.channel.id:
-                pvch = p
-                break
-        user: discord.Member = self.guild.get_member(pvch.user_id)
+        pvch: Optional[PrivateChannel] = part.registry.get_by_txt(ctx.channel.id)
+        if pvch is None:
+            await ctx.response.send_message(embed=error_embed_template("プライベートチャンネルが見つかりませんでした。"), ephemeral=True)
+            return
+
+        await ctx.response.defer(ephemeral=True)
+        # Membership comes from the channel's member overwrites, so this scales with the channel, not the guild
+        members: list[Optional[discord.Member]] = await asyncio.gather(*[part.member_cache.get(part.guild, member_id)
+                                                                          for member_id in (pvch.user_id, *pvch.guests)])
+        user: Optional[discord.Member] = members[0]
+
+        online_members: list[str] = []
+        offline_members: list[str] = []
+        for member in members:
+            if member is None or member.bot or part.is_staff(member):
+                continue
+            if not LOW_MEMORY_MODE and member.status is discord.Status.offline:
+                offline_members.append(member.display_name)
+            else:
+                online_members.append(member.display_name)
 
         embed: Embed = Embed(title="プライベートチャンネル情報", color=0x979c9f)
         embed.add_field(name="チャンネル名", value=pvch.txt_channel.name, inline=False)
-        embed.add_field(name="チャンネル作成者", value=user.display_name, inline=False)
-
-        online_value: str = ""
-        offline_value: str = ""
-        for member in pvch.txt_channel.members:
-            if not member.bot and member.top_role.id not in [OWNER_ROLE_ID, MODERATOR_ROLE_ID]:
-                if member.status is discord.Status.offline:
-                    offline_value += f"- {member.display_name}\n"
-                else:
-                    online_value += f"- {member.display_name}\n"
-
-        if online_value != "":
-            embed.add_field(name="オンライン", value=online_value)
-        if offline_value != "":
-            embed.add_field(name="オフライン", value=offline_value)
-        await ctx.response.send_message(embed=embed, ephemeral=True)
+        embed.add_field(name="チャンネル作成者", value=user.display_name if user is not None else f"<@{pvch.user_id}>", inline=False)
+        if len(online_members) > 0:
+            # No presence information in low memory mode, list everyone without their status
+            embed.add_field(name="参加者" if LOW_MEMORY_MODE else "オンライン", value="- "+"\n- ".join(online_members))
+        if len(offline_members) > 0:
+            embed.add_field(name="オフライン", value="- "+"\n- ".join(offline_members))
+        await ctx.followup.send(embed=embed, ephemeral=True)
 
     @app_commands.command(name="pvch_create", description="自分のプライベートチャンネルを作成する")
     @app_commands.checks.cooldown(3, 20.0, key=lambda i: (i.guild_id, i.user.id))
     async def pvch_create(self, ctx: discord.Interaction):
         """Create private channel"""
-        if ctx.channel.category_id == CATEGORY_ID:
+        part: GuildPartition = partitions[ctx.guild_id]
+        if part.in_pvch_category(ctx.channel):
             await ctx.response.send_message(embed=error_embed_template("このコマンドはプライベートチャンネルでは実行できません。"), ephemeral=True)
             return
 
         await ctx.response.defer(ephemeral=True)
+        key: tuple[int, int] = (part.guild_id, ctx.user.id)
+        if key in self.creating:  # Concurrent invocation, it would create a second pair
+            await ctx.followup.send(embed=error_embed_template("プライベートチャンネルを作成中です。"), ephemeral=True)
+            return
+        self.creating.add(key)
+        try:
+            await self.create_private_channel(part, ctx)
+        finally:
+            self.creating.discard(key)
+
+    async def create_private_channel(self, part: GuildPartition, ctx: discord.Interaction):
+        """Body of /pvch_create, never runs concurrently for the same owner"""
         user_id: int = ctx.user.id
         # Check if private channels already exists.
-        if (pvch := pvch_data.get(user_id)) is not None:
-            if self.guild.get_channel(pvch.txt_channel.id) is not None:
+        if (pvch := part.registry.get(user_id)) is not None:
+            if part.guild.get_channel(pvch.txt_channel.id) is not None:
                 msg: str = f"あなたのプライベートチャンネル{pvch.txt_channel.mention}は既に存在します。\n\nヒント: `/pvch_delete`でプライベートチャンネルを削除することができます。"
                 await ctx.followup.send(embed=error_embed_template(msg), ephemeral=True)
                 return
             else:
-                del pvch_data[user_id]
+                part.unregister(user_id)
 
         # Create private channel
         ch_name: str = f"pvch-{ctx.user.name}"
-        try:
-            txt_channel: TextChannel = await self.category.create_text_channel(name=ch_name)
-            await txt_channel.set_permissions(ctx.user, overwrite=discord.PermissionOverwrite(view_channel=True))
-            vc_channel: VoiceChannel = await self.category.create_voice_channel(name=ch_name)
-            await vc_channel.set_permissions(ctx.user, overwrite=discord.PermissionOverwrite(view_channel=True))
-        except discord.HTTPException:
-            logger.error("Failed to create private channel.")
+        channels: Optional[tuple[TextChannel, VoiceChannel]] = await self.provision_channels(part, ch_name, ctx.user)
+        if channels is None:
             await ctx.followup.send(embed=error_embed_template("プライベートチャンネルの作成に失敗しました。"), ephemeral=True)
             return
+        txt_channel, vc_channel = channels
 
         pvch: PrivateChannel = PrivateChannel(user_id, txt_channel, vc_channel)
-        pvch_data[user_id] = pvch
-        pvch_data_csv.write(pvch)
-        await pvch.send_welcome_message()
+        part.registry.add(pvch)
+        part.pvch_data_csv.write(pvch)
+        part.activity_tracker.touch(user_id)
+        part.schedule_expiry(user_id)
+        self.run_in_background(pvch.send_welcome_message())
 
         # Creating a User Invitation Component
         msg: str = f"{txt_channel.mention}を作成しました。\n\nユーザーの招待は下のリストからできます(最大25人まで)"
@@ -245,13 +595,14 @@ class PrivateChannelBot(commands.Cog):
     @app_commands.checks.cooldown(3, 20.0, key=lambda i: (i.guild_id, i.user.id))
     async def pvch_delete(self, ctx: discord.Interaction):
         """Delete private channel"""
-        pvch: Optional[PrivateChannel] = pvch_data.get(ctx.user.id)
+        part: GuildPartition = partitions[ctx.guild_id]
+        pvch: Optional[PrivateChannel] = part.registry.get(ctx.user.id)
         if pvch is None:
             msg: str = "あなたはまだプライベートチャンネルを作成していないようです。\n\nヒント: `/pvch_create`で作成することができます。"
             await ctx.response.send_message(embed=error_embed_template(msg), ephemeral=True)
             return
 
-        if ctx.channel.category_id == CATEGORY_ID and ctx.channel.id != pvch.txt_channel.id:  # In someone else's private channel
+        if part.in_pvch_category(ctx.channel) and ctx.channel.id != pvch.txt_channel.id:  # In someone else's private channel
             await ctx.response.send_message(embed=error_embed_template("このコマンドは他人のプライベートチャンネル内では実行できません。"), ephemeral=True)
             return
         
@@ -262,11 +613,12 @@ class PrivateChannelBot(commands.Cog):
     @app_commands.checks.cooldown(3, 20.0, key=lambda i: (i.guild_id, i.user.id))
     async def pvch_invite(self, ctx: discord.Interaction):
         """Invite user to private channel"""
-        if ctx.channel.category_id == CATEGORY_ID:
+        part: GuildPartition = partitions[ctx.guild_id]
+        if part.in_pvch_category(ctx.channel):
             await ctx.response.send_message(embed=error_embed_template("このコマンドはプライベートチャンネル内では実行できません。"), ephemeral=True)
             return
         
-        pvch: Optional[PrivateChannel] = pvch_data.get(ctx.user.id)
+        pvch: Optional[PrivateChannel] = part.registry.get(ctx.user.id)
         if pvch is None:
             msg: str = "あなたはまだプライベートチャンネルを作成していないようです。\n\nヒント: `/pvch_create`で作成することができます。"
             await ctx.response.send_message(embed=error_embed_template(msg), ephemeral=True)
@@ -279,25 +631,23 @@ class PrivateChannelBot(commands.Cog):
     @app_commands.checks.cooldown(3, 20.0, key=lambda i: (i.guild_id, i.user.id))
     async def pvch_leave(self, ctx: discord.Interaction):
         """Leave private channel"""
-        if ctx.channel.category_id != CATEGORY_ID:
+        part: GuildPartition = partitions[ctx.guild_id]
+        if not part.in_pvch_category(ctx.channel):
             await ctx.response.send_message(embed=error_embed_template("このコマンドはプライベートチャンネルでのみ使用できます。"), ephemeral=True)
             return
 
         await ctx.response.defer()
-        pvch: Optional[PrivateChannel] = pvch_data.get(ctx.user.id)
-        if pvch is not None and ctx.channel.id == pvch.txt_channel.id:
+        pvch: Optional[PrivateChannel] = part.registry.get_by_txt(ctx.channel.id)
+        if pvch is None:
+            await ctx.followup.send(embed=error_embed_template("プライベートチャンネルが見つかりませんでした。"), ephemeral=True)
+            return
+        if pvch.user_id == ctx.user.id:
             await ctx.followup.send(embed=error_embed_template("このコマンドはこのプライベートチャンネルの作成者は実行できません。\n\nヒント: `/pvch_delete`で削除することができます。"),
                                             ephemeral=True)
             return
 
-        for p in pvch_data.values():
-            if p.txt_channel.id == ctx.channel.id:
-                pvch = p
-                break
-
         try:
-            await pvch.txt_channel.set_permissions(ctx.user, overwrite=None)
-            await pvch.vc_channel.set_permissions(ctx.user, view_channel=False)
+            await pvch.revoke([ctx.user])
             await ctx.followup.send(embed=info_embed_template(f"{ctx.user.display_name}さんがプライベートチャンネルを退出しました。"))
         except discord.HTTPException:
             logger.error("Failed to leave private channel.")
@@ -307,11 +657,12 @@ class PrivateChannelBot(commands.Cog):
     @app_commands.checks.cooldown(3, 20.0, key=lambda i: (i.guild_id, i.user.id))
     async def pvch_kick(self, ctx: discord.Interaction):
         """Kick private channel"""
-        if ctx.channel.category_id != CATEGORY_ID:
+        part: GuildPartition = partitions[ctx.guild_id]
+        if not part.in_pvch_category(ctx.channel):
             await ctx.response.send_message(embed=error_embed_template("このコマンドはプライベートチャンネルでのみ使用できます。"), ephemeral=True)
             return
 
-        pvch: Optional[PrivateChannel] = pvch_data.get(ctx.user.id)
+        pvch: Optional[PrivateChannel] = part.registry.get(ctx.user.id)
         if pvch is None or ctx.channel.id != pvch.txt_channel.id:  # In someone else's private channel
             await ctx.response.send_message(embed=error_embed_template("このコマンドは他人のプライベートチャンネル内では実行できません。"), ephemeral=True)
             return
@@ -324,7 +675,7 @@ class PrivateChannelBot(commands.Cog):
     @app_commands.default_permissions(administrator=True)
     async def pvch_admin_delete(self, ctx: discord.Interaction, pv_user: discord.User):
         """[Admin only] Delete private channel"""
-        pvch: PrivateChannel = pvch_data.get(pv_user.id)
+        pvch: PrivateChannel = partitions[ctx.guild_id].registry.get(pv_user.id)
         if pvch is None:
             msg: str = f"指定した{pv_user.mention}のプライベートチャンネルが見つかりませんでした。"
             await ctx.response.send_message(embed=error_embed_template(msg), ephemeral=True)
@@ -349,39 +700,193 @@ class PrivateChannelBot(commands.Cog):
             return
 
         await ctx.response.defer(ephemeral=True)
-        pvch: PrivateChannel = pvch_data.get(pv_user.id)
+        pvch: PrivateChannel = partitions[ctx.guild_id].registry.get(pv_user.id)
         if pvch is None:
             msg: str = f"指定した{pv_user.mention}のプライベートチャンネルが見つかりませんでした。"
             await ctx.followup.send(embed=error_embed_template(msg), ephemeral=True)
             return
 
         try:
-            await pvch.txt_channel.set_permissions(kick_user, overwrite=None)
-            await pvch.vc_channel.set_permissions(kick_user, view_channel=False)
+            await pvch.revoke([kick_user])
             await ctx.followup.send(embed=kick_embed_template("成功"), ephemeral=True)
         except discord.HTTPException:
             await ctx.followup.send(embed=kick_embed_template("失敗"), ephemeral=True)
 
-    @tasks.loop(hours=24)
-    async def check_pv_exp(self):
-        """Check private channel expiration date"""
-        delete_pvchs: list[int] = []
-
-        inactive: int = INACTIVE_DAYS
-        for user_id, pvch in pvch_data.items():
-            for sb in self.guild.premium_subscribers:
-                if user_id == sb.id:
-                    inactive = INACTIVE_SB_DAYS
-                    break
-
-            if await pvch.is_expired(inactive):
-                delete_pvchs.append(user_id)
-
-        # Automatic deletion
-        if len(delete_pvchs) > 0:
-            for user_id in delete_pvchs:
-                pvch: PrivateChannel = pvch_data[user_id]
-                await pvch.force_delete()
+    @app_commands.command(name="pvch_admin_stats", description="[権限者専用] ボットの統計情報を表示")
+    @app_commands.checks.cooldown(3, 10.0, key=lambda i: (i.guild_id, i.user.id))
+    @app_commands.default_permissions(administrator=True)
+    async def pvch_admin_stats(self, ctx: discord.Interaction):
+        """[Admin only] Display bot statistics"""
+        part: GuildPartition = partitions[ctx.guild_id]
+        embed: Embed = Embed(title="統計情報", color=0x979c9f)
+        now: float = datetime.now().timestamp()
+        # One indexed query on SQLite, a scan of the records in memory otherwise; owners whose stored activity is past the limit wait for the next check
+        expired: list[int] = await asyncio.to_thread(part.pvch_data_csv.expired, now - timedelta(days=part.config.inactive_days).total_seconds(),
+                                                     now - timedelta(days=part.config.inactive_sb_days).total_seconds())
+        embed.add_field(name="プライベートチャンネル", value=f"{len(part.registry)}件 (期限スケジュール: {len(part.expiry_scheduler)}件、期限超過: {len(expired)}件)",
+                        inline=False)
+        embed.add_field(name="サーバー", value=f"{len(partitions)}件 (シャード: {ctx.guild.shard_id}/{self.bot.shard_count or 1})", inline=False)
+        if part.channel_pool.enabled:
+            embed.add_field(name="チャンネルプール", value=" / ".join(f"{k}={v}" for k, v in part.channel_pool.stats().items()), inline=False)
+        if part.last_sweep is not None:
+            embed.add_field(name="前回の期限チェック", value=str(part.last_sweep), inline=False)
+        for priority, stats in rest_queue.stats_dict().items():
+            embed.add_field(name=f"RESTキュー ({priority})", value=" / ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()),
+                            inline=False)
+        if metrics.enabled:
+            latency: list[str] = [f"- `/{labels[0][1]}`: p50={histogram.quantile(0.5)}s, p95={histogram.quantile(0.95)}s (n={histogram.count})"
+                                  for labels, histogram in metrics.histograms.get("pvch_command_seconds", {}).items() if labels[1] == ("outcome", "success")]
+            if len(latency) > 0:
+                embed.add_field(name="コマンド応答時間", value="\n".join(latency), inline=False)
+        await ctx.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="pvch_admin_archives", description="[権限者専用] 削除前に保存したアーカイブの一覧を表示")
+    @app_commands.checks.cooldown(3, 10.0, key=lambda i: (i.guild_id, i.user.id))
+    @app_commands.default_permissions(administrator=True)
+    async def pvch_admin_archives(self, ctx: discord.Interaction):
+        """[Admin only] List channel archives"""
+        await ctx.response.defer(ephemeral=True)
+        archives: list[ArchiveInfo] = await asyncio.to_thread(self.archiver.archives, ctx.guild_id)
+        if len(archives) == 0:
+            await ctx.followup.send(embed=info_embed_template("アーカイブはありません。"), ephemeral=True)
+            return
+
+        lines: list[str] = []
+        length: int = 0
+        for info in archives:
+            line: str = (f"- `{os.path.basename(info.path)}` #{info.channel_name} (<@{info.user_id}>): "
+                         f"{format_size(info.offset)}, {info.messages}件{'' if info.complete else ' (中断)'}")
+            if length + len(line) + 1 > 3900:  # Embed description limit
+                lines.append(f"他{len(archives) - len(lines)}件")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        embed: Embed = Embed(title="アーカイブ", description="\n".join(lines), color=0x979c9f)
+        embed.add_field(name="合計", value=f"{len(archives)}件 / {format_size(sum(info.offset for info in archives))}", inline=False)
+        embed.add_field(name="保存先", value=f"`{os.path.join(self.archiver.directory, str(ctx.guild_id))}`", inline=False)
+        await ctx.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="pvch_admin_reload", description="[権限者専用] 再起動せずに設定とプログラムを再読み込み")
+    @app_commands.checks.cooldown(1, 30.0, key=lambda i: (i.guild_id, i.user.id))
+    @app_commands.default_permissions(administrator=True)
+    async def pvch_admin_reload(self, ctx: discord.Interaction):
+        """[Admin only] Reload the extension, handing the state to the new cog"""
+        if not await self.bot.is_owner(ctx.user):  # Affects every guild served by the process
+            await ctx.response.send_message(embed=error_embed_template("このコマンドはボットの所有者のみ実行できます。"), ephemeral=True)
+            return
+
+        await ctx.response.defer(ephemeral=True)
+        try:
+            load_guild_configs()  # Refuse a broken config file before anything is unloaded
+        except (OSError, ValueError) as e:
+            await ctx.followup.send(embed=error_embed_template(f"サーバー設定ファイルを読み込めません。\n`{e}`"), ephemeral=True)
+            return
+        self.handing_off = True
+        try:
+            elapsed: float = await reload_extension(self.bot)
+        except commands.ExtensionError as e:
+            logger.exception("Failed to reload the private channel extension.")
+            await ctx.followup.send(embed=error_embed_template(f"再読み込みに失敗したため、以前のプログラムで動作を継続します。\n`{e}`"), ephemeral=True)
+            return
+        finally:
+            self.handing_off = False
+        new_cog: Optional[commands.Cog] = self.bot.get_cog(self.qualified_name)
+        handoff: Optional[float] = getattr(new_cog, "handoff_seconds", None)
+        msg: str = f"再読み込みしました。(所要時間: {elapsed:.3f}秒"
+        msg += f"、状態の引き継ぎ: {handoff:.3f}秒)" if handoff is not None else ")"
+        await ctx.followup.send(embed=success_embed_template(msg), ephemeral=True)
+
+    def run_in_background(self, coro):
+        """Run a coroutine without awaiting it, keeping a reference until it finishes"""
+        task: asyncio.Task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def provision_channels(self, part: GuildPartition, ch_name: str, owner: discord.abc.User) -> Optional[tuple[TextChannel, VoiceChannel]]:
+        """Provide a text/voice channel pair only the owner can see, from the warm pool if possible"""
+        allow: discord.PermissionOverwrite = discord.PermissionOverwrite(view_channel=True)
+
+        if (pooled := part.channel_pool.acquire()) is not None:
+            overwrites: dict = PrivateChannel._merge_overwrites(pooled[0].category, {owner: allow})
+            results: list = await asyncio.gather(*[rest_queue.submit(lambda channel=channel: part.channel_edits.edit(channel, name=ch_name, overwrites=overwrites),
+                                                                     bucket=channel.id, route="channel.edit") for channel in pooled],
+                                                 return_exceptions=True)
+            if not any(isinstance(result, BaseException) for result in results):
+                return tuple(edited or channel for edited, channel in zip(results, pooled))  # The pooled objects still hold the pool's overwrites
+            logger.error("Failed to take over pooled private channel.")
+            await self._delete_channels(pooled)
+
+        try:
+            results: list = await part.category_allocator.create_pair(ch_name, lambda category: PrivateChannel._merge_overwrites(category, {owner: allow}))
+        except discord.HTTPException:
+            logger.error("Failed to create overflow category.")
+            return None
+        if any(isinstance(result, BaseException) for result in results):
+            logger.error("Failed to create private channel.")
+            await self._delete_channels([channel for channel in results if not isinstance(channel, BaseException)])  # Roll back the created half
+            return None
+        return results[0], results[1]
+
+    async def _delete_channels(self, channels: list[discord.abc.GuildChannel]):
+        for channel in channels:
+            try:
+                await rest_queue.delete(channel)
+            except discord.HTTPException:
+                logger.error(f"Failed to delete channel {channel.id}.")
+
+    async def check_pv_exp(self, part: GuildPartition, user_ids: list[int]):
+        """Check expiration of the guild's private channels whose deadline is due"""
+        boosters: set[int] = {sb.id for sb in part.guild.premium_subscribers}
+
+        async def is_expired(user_id: int) -> bool:
+            pvch: Optional[PrivateChannel] = part.registry.get(user_id)
+            if pvch is None:
+                return False
+            booster: bool = user_id in boosters
+            if LOW_MEMORY_MODE:  # premium_subscribers only covers cached members
+                owner: Optional[discord.Member] = await part.member_cache.get(part.guild, user_id)
+                booster = owner is not None and owner.premium_since is not None
+            part.pvch_data_csv.set_booster(user_id, booster)
+            return await pvch.is_expired(part.inactive_days(booster))
+
+        async def delete(user_id: int) -> bool:
+            pvch: Optional[PrivateChannel] = part.registry.get(user_id)
+            if pvch is None:
+                return True
+            if PVCH_ARCHIVE_ENABLED and not await self.archive_channel(pvch):
+                return False  # Not deleted without its archive, the next attempt resumes it
+            return await pvch.force_delete(Priority.MAINTENANCE)  # Automatic deletion
+
+        stats, alive = await run_sweep(user_ids, is_expired, delete, PVCH_EXPIRY_CHECK_CONCURRENCY, PVCH_EXPIRY_DELETE_CONCURRENCY)
+        part.last_sweep = stats
+        metrics.observe("pvch_expiry_sweep_seconds", stats.duration)
+        metrics.inc("pvch_expiry_channels_total", stats.checked, result="checked")
+        metrics.inc("pvch_expiry_channels_total", stats.expired, result="expired")
+        metrics.inc("pvch_expiry_channels_total", stats.failed, result="failed")
+        logger.info(f"Expiry sweep of guild {part.guild_id}: {stats}")
+
+        now: float = datetime.now().timestamp()
+        for user_id in alive:
+            part.schedule_expiry(user_id)
+            deadline: Optional[float] = part.expiry_scheduler.get(user_id)
+            if deadline is not None and deadline <= now:  # Check or deletion failed, retry later
+                part.expiry_scheduler.schedule(user_id, now + ExpiryScheduler.RETRY_DELAY)
+
+    async def archive_channel(self, pvch: PrivateChannel) -> bool:
+        """Archive the text history of a private channel about to be deleted"""
+        try:
+            await self.archiver.archive(pvch)
+            return True
+        except (discord.HTTPException, OSError):
+            logger.exception(f"Failed to archive private channel {pvch.txt_channel.name}.")
+            return False
+
+    @tasks.loop(minutes=PVCH_COMPACT_INTERVAL_MINUTES)
+    async def compact_pvch_data(self):
+        """Fold the private channel journals into snapshots in the background"""
+        for part in list(partitions.values()):
+            if part.pvch_data_csv.needs_compaction():
+                await asyncio.to_thread(part.pvch_data_csv.compact)
 
 
 def setup(bot: commands.Bot):
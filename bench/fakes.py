@@ -0,0 +1,469 @@
+"""In-process stand-ins for the discord.py objects the cog touches
+
+Channels and roles subclass the real discord.py classes so the cog's isinstance checks behave as in production.
+Every mutation goes through a `RestSimulator`, which adds latency and enforces per-bucket rate limits.
+As with discord.py, creating or editing a channel returns a new object, and the guild's cached channels only
+change when the simulated gateway event arrives, `gateway_delay` seconds later.
+"""
+import discord
+from discord import CategoryChannel, TextChannel, VoiceChannel
+
+import asyncio
+import copy
+import itertools
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Optional, Union
+
+
+CATEGORY_LIMIT: int = 50  # Channels Discord allows in a category
+
+
+def http_error(cls: type, status: int, message: Union[str, dict[str, Any]]) -> discord.HTTPException:
+    """Build a discord.py HTTP error without an aiohttp response"""
+    return cls(SimpleNamespace(status=status, reason=message if isinstance(message, str) else message["message"]), message)
+
+
+class RestSimulator:
+    """Simulated Discord REST API: a fixed latency per request plus per-bucket rate limits
+
+    A bucket allows `bucket_limit` requests per `bucket_window` seconds (0 disables the limit).
+    Requests over the limit wait for the window to reset, as discord.py does on a 429.
+    """
+    def __init__(self, latency: float = 0.0, bucket_limit: int = 0, bucket_window: float = 1.0):
+        self.latency: float = latency
+        self.bucket_limit: int = bucket_limit
+        self.bucket_window: float = bucket_window
+        self.calls: Counter = Counter()  # {route: requests}
+        self.rate_limited: Counter = Counter()  # {route: requests that had to wait for a bucket}
+        self._windows: dict[Hashable, tuple[float, int]] = {}  # {bucket: (reset_at, used)}
+
+    async def request(self, route: str, bucket: Hashable):
+        self.calls[route] += 1
+        if self.bucket_limit > 0:
+            while True:
+                now: float = time.monotonic()
+                reset_at, used = self._windows.get(bucket, (now + self.bucket_window, 0))
+                if now >= reset_at:
+                    reset_at, used = now + self.bucket_window, 0
+                if used < self.bucket_limit:
+                    self._windows[bucket] = (reset_at, used + 1)
+                    break
+                self.rate_limited[route] += 1
+                await asyncio.sleep(reset_at - now)
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def reset(self):
+        self.calls.clear()
+        self.rate_limited.clear()
+        self._windows.clear()
+
+
+class FakeRole(discord.Role):
+    def __init__(self, guild: 'FakeGuild', role_id: int, name: str):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.position = 0
+
+    def __repr__(self) -> str:
+        return f"<FakeRole id={self.id} name={self.name!r}>"
+
+
+class FakeMember:
+    """Member stand-in, hashable by id so it can key permission overwrites"""
+    __slots__ = ("guild", "id", "name", "display_name", "bot", "premium_since", "status", "top_role")
+
+    def __init__(self, guild: 'FakeGuild', user_id: int, name: str, bot: bool = False, premium_since: Optional[datetime] = None,
+                 status: discord.Status = discord.Status.online):
+        self.guild: FakeGuild = guild
+        self.id: int = user_id
+        self.name: str = name
+        self.display_name: str = name
+        self.bot: bool = bot
+        self.premium_since: Optional[datetime] = premium_since
+        self.status: discord.Status = status
+        self.top_role: FakeRole = guild.default_role
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, FakeMember) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"<FakeMember id={self.id} name={self.name!r}>"
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+
+class FakeMessage:
+    __slots__ = ("id", "channel", "author", "content", "embeds", "pinned")
+
+    def __init__(self, channel: 'FakeTextChannel', message_id: int, author: FakeMember, content: str = "", embeds: tuple = ()):
+        self.id: int = message_id
+        self.channel: FakeTextChannel = channel
+        self.author: FakeMember = author
+        self.content: str = content
+        self.embeds: list[discord.Embed] = list(embeds)
+        self.pinned: bool = False
+
+    edited_at: Optional[datetime] = None
+    attachments: tuple = ()
+    reference: None = None
+
+    @property
+    def created_at(self) -> datetime:
+        return discord.utils.snowflake_time(self.id)
+
+    async def pin(self):
+        await self.channel.guild.rest.request("message.pin", self.channel.id)
+        self.pinned = True
+
+
+class _FakeChannelMixin:
+    """REST-backed mutations shared by every fake channel type"""
+    def _setup(self, guild: 'FakeGuild', channel_id: int, name: str, category_id: Optional[int], overwrites: Optional[dict], position: int):
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.category_id = category_id
+        self.position = position
+        self._fake_overwrites: dict = dict(overwrites or {})
+        self._server: dict[str, Any] = {"name": name, "_fake_overwrites": self._fake_overwrites}  # State on Discord's side, ahead of the cache
+
+    def __copy__(self) -> '_FakeChannelMixin':
+        clone: _FakeChannelMixin = type(self).__new__(type(self))
+        clone._setup(self.guild, self.id, self.name, self.category_id, self._fake_overwrites, self.position)
+        clone.__dict__.update(self.__dict__)  # Shares the server-side state and the message history
+        return clone
+
+    @property
+    def overwrites(self) -> dict:
+        return dict(self._fake_overwrites)
+
+    async def edit(self, *, name: Optional[str] = None, overwrites: Optional[dict] = None, **options):
+        """Edit the channel on the server side, returns a new object and updates the cached channel later"""
+        await self.guild.rest.request("channel.edit", self.id)
+        if (cached := self.guild.server_channel(self.id)) is None:
+            raise http_error(discord.NotFound, 404, "Unknown Channel")
+        if name is not None:
+            cached._server["name"] = name
+        if overwrites is not None:
+            cached._server["_fake_overwrites"] = dict(overwrites)
+        edited: _FakeChannelMixin = copy.copy(cached)
+        state: dict[str, Any] = dict(cached._server)
+        for attr, value in state.items():
+            setattr(edited, attr, value)
+        self.guild.gateway_update(cached, state)
+        return edited
+
+    async def delete(self, *, reason: Optional[str] = None):
+        await self.guild.rest.request("channel.delete", self.id)
+        if self.guild.server_channel(self.id) is None:
+            raise http_error(discord.NotFound, 404, "Unknown Channel")
+        self.guild.remove_channel(self)
+
+
+class FakeTextChannel(_FakeChannelMixin, TextChannel):
+    def __init__(self, guild: 'FakeGuild', channel_id: int, name: str, category_id: Optional[int] = None,
+                 overwrites: Optional[dict] = None, position: int = 0):
+        self._setup(guild, channel_id, name, category_id, overwrites, position)
+        self.messages: list[FakeMessage] = []  # Oldest first
+
+    @property
+    def last_message_id(self) -> Optional[int]:
+        return self.messages[-1].id if len(self.messages) > 0 else None
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None, **options) -> FakeMessage:
+        await self.guild.rest.request("channel.send", self.id)
+        if self.guild.server_channel(self.id) is None:
+            raise http_error(discord.NotFound, 404, "Unknown Channel")
+        return self.add_message(self.guild.me, content or "", (embed,) if embed is not None else ())
+
+    def add_message(self, author: FakeMember, content: str = "", embeds: tuple = (), created_at: Optional[datetime] = None) -> FakeMessage:
+        """Seed a message without any REST call"""
+        message: FakeMessage = FakeMessage(self, self.guild.next_id(created_at), author, content, embeds)
+        self.messages.append(message)
+        return message
+
+    async def history(self, *, limit: Optional[int] = 100, before: Optional[discord.abc.Snowflake] = None, after: Optional[discord.abc.Snowflake] = None,
+                      oldest_first: Optional[bool] = None) -> AsyncIterator[FakeMessage]:
+        """Pages of 100 messages, one request each, as discord.py fetches them"""
+        if oldest_first is None:
+            oldest_first = after is not None
+        messages: list[FakeMessage] = [message for message in self.messages
+                                       if (after is None or message.id > after.id) and (before is None or message.id < before.id)]
+        if not oldest_first:
+            messages.reverse()
+        if limit is not None:
+            messages = messages[:limit]
+        for i in range(0, max(len(messages), 1), 100):
+            await self.guild.rest.request("channel.history", self.id)
+            if self.guild.server_channel(self.id) is None:
+                raise http_error(discord.NotFound, 404, "Unknown Channel")
+            for message in messages[i:i + 100]:
+                yield message
+
+
+class FakeVoiceChannel(_FakeChannelMixin, VoiceChannel):
+    def __init__(self, guild: 'FakeGuild', channel_id: int, name: str, category_id: Optional[int] = None,
+                 overwrites: Optional[dict] = None, position: int = 0):
+        self._setup(guild, channel_id, name, category_id, overwrites, position)
+        self.connected: set[int] = set()  # Ids of members in the voice channel
+
+    @property
+    def voice_states(self) -> dict[int, Any]:
+        return {member_id: None for member_id in self.connected}
+
+
+class FakeCategoryChannel(_FakeChannelMixin, CategoryChannel):
+    def __init__(self, guild: 'FakeGuild', channel_id: int, name: str, overwrites: Optional[dict] = None, position: int = 0):
+        self._setup(guild, channel_id, name, None, overwrites, position)
+
+    @property
+    def channels(self) -> list[discord.abc.GuildChannel]:
+        return [*self.text_channels, *self.voice_channels]
+
+    @property
+    def text_channels(self) -> list[FakeTextChannel]:
+        return [ch for ch in self.guild.children(self.id) if isinstance(ch, TextChannel)]
+
+    @property
+    def voice_channels(self) -> list[FakeVoiceChannel]:
+        return [ch for ch in self.guild.children(self.id) if isinstance(ch, VoiceChannel)]
+
+    async def create_text_channel(self, name: str, *, overwrites: Optional[dict] = None, **options) -> FakeTextChannel:
+        await self.guild.rest.request("guild.create_channel", self.guild.id)
+        return self.guild.create_channel(FakeTextChannel(self.guild, self.guild.next_id(), name, self.id, overwrites))
+
+    async def create_voice_channel(self, name: str, *, overwrites: Optional[dict] = None, **options) -> FakeVoiceChannel:
+        await self.guild.rest.request("guild.create_channel", self.guild.id)
+        return self.guild.create_channel(FakeVoiceChannel(self.guild, self.guild.next_id(), name, self.id, overwrites))
+
+
+class FakeGuild:
+    """Guild stand-in holding channels and members in memory
+
+    Deleting a channel dispatches `guild_channel_delete` to the subscribed listeners, like the gateway echo of a real deletion.
+    Creations and edits reach the cached channels in order, `gateway_delay` seconds after the server side changed,
+    dispatching `guild_channel_create` and `guild_channel_update`. Like Discord, a category refuses more than CATEGORY_LIMIT channels.
+    """
+    def __init__(self, rest: Optional[RestSimulator] = None, name: str = "bench", gateway_delay: float = 0.0):
+        self.rest: RestSimulator = rest if rest is not None else RestSimulator()
+        self.gateway_delay: float = gateway_delay
+        self._ids: itertools.count = itertools.count()
+        self.id: int = self.next_id()
+        self.name: str = name
+        self.default_role: FakeRole = FakeRole(self, self.id, "@everyone")
+        self.me: FakeMember = FakeMember(self, self.next_id(), "PrivateChannelBot", bot=True)
+        self._channels: dict[int, discord.abc.GuildChannel] = {}
+        self._children: dict[Optional[int], dict[int, discord.abc.GuildChannel]] = {}  # {category_id: {channel_id: channel}}
+        self._server: dict[int, discord.abc.GuildChannel] = {}  # Channels on Discord's side, including created ones not cached yet
+        self._server_children: Counter = Counter()  # {category_id: channels on Discord's side}
+        self._members: dict[int, FakeMember] = {}
+        self._listeners: dict[str, list[Callable[..., Awaitable[None]]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._gateway_events: deque[tuple[float, discord.abc.GuildChannel, Optional[dict[str, Any]]]] = deque()  # (due, channel, new state or None if created)
+        self._gateway_task: Optional[asyncio.Task] = None
+
+    def next_id(self, when: Optional[datetime] = None) -> int:
+        """Snowflake for `when` (default now), unique within the guild"""
+        return discord.utils.time_snowflake(when or datetime.now(timezone.utc)) + next(self._ids) % (1 << 22)
+
+    @property
+    def channels(self) -> list[discord.abc.GuildChannel]:
+        return list(self._channels.values())
+
+    @property
+    def categories(self) -> list[FakeCategoryChannel]:
+        return [ch for ch in self._channels.values() if isinstance(ch, CategoryChannel)]
+
+    @property
+    def members(self) -> list[FakeMember]:
+        return list(self._members.values())
+
+    @property
+    def premium_subscribers(self) -> list[FakeMember]:
+        return [member for member in self._members.values() if member.premium_since is not None]
+
+    def children(self, category_id: int) -> list[discord.abc.GuildChannel]:
+        return list(self._children.get(category_id, {}).values())
+
+    def get_channel(self, channel_id: int) -> Optional[discord.abc.GuildChannel]:
+        return self._channels.get(channel_id)
+
+    def server_channel(self, channel_id: int) -> Optional[discord.abc.GuildChannel]:
+        """The channel as Discord knows it, which may not have reached the cache yet"""
+        return self._server.get(channel_id)
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self._members.get(user_id)
+
+    async def fetch_member(self, user_id: int) -> FakeMember:
+        await self.rest.request("guild.fetch_member", self.id)
+        if (member := self._members.get(user_id)) is None:
+            raise http_error(discord.NotFound, 404, "Unknown Member")
+        return member
+
+    async def create_category(self, name: str, *, overwrites: Optional[dict] = None, position: int = 0, **options) -> FakeCategoryChannel:
+        await self.rest.request("guild.create_channel", self.id)
+        return self.create_channel(FakeCategoryChannel(self, self.next_id(), name, overwrites, position))
+
+    def create_channel(self, channel: discord.abc.GuildChannel) -> Any:
+        """Create the channel on the server side, returns a copy and caches the channel later"""
+        if channel.category_id is not None and self._server_children[channel.category_id] >= CATEGORY_LIMIT:
+            raise http_error(discord.HTTPException, 400, {"code": 50035, "message": "Invalid Form Body", "errors": {"parent_id": {"_errors": [
+                {"code": "CHANNEL_PARENT_MAX_CHANNELS", "message": f"Maximum number of channels in category reached ({CATEGORY_LIMIT})"}]}}})
+        self._add_server_channel(channel)
+        self._queue_gateway_event(channel, None)
+        return copy.copy(channel)  # Not the cached object, as with discord.py
+
+    def subscribe(self, event: str, listener: Callable[..., Awaitable[None]]):
+        self._listeners.setdefault(event, []).append(listener)
+
+    def dispatch(self, event: str, *args):
+        for listener in self._listeners.get(event, ()):
+            task: asyncio.Task = asyncio.get_running_loop().create_task(listener(*args))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def gateway_update(self, channel: discord.abc.GuildChannel, state: dict[str, Any]):
+        """Apply a server-side change to the cached channel after the gateway delay"""
+        self._queue_gateway_event(channel, state)
+
+    def _queue_gateway_event(self, channel: discord.abc.GuildChannel, state: Optional[dict[str, Any]]):
+        self._gateway_events.append((time.monotonic() + self.gateway_delay, channel, state))
+        if self._gateway_task is None or self._gateway_task.done():
+            self._gateway_task = asyncio.get_running_loop().create_task(self._run_gateway())
+            self._tasks.add(self._gateway_task)
+            self._gateway_task.add_done_callback(self._tasks.discard)
+
+    async def _run_gateway(self):
+        while self._gateway_events:
+            due, channel, state = self._gateway_events.popleft()
+            if (delay := due - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+            if self._server.get(channel.id) is not channel:  # Deleted meanwhile
+                continue
+            if state is None:
+                self._add_channel(channel)
+                self.dispatch("guild_channel_create", channel)
+                continue
+            before: discord.abc.GuildChannel = copy.copy(channel)
+            for attr, value in state.items():
+                setattr(channel, attr, value)
+            self.dispatch("guild_channel_update", before, channel)
+
+    @property
+    def busy(self) -> bool:
+        return len(self._tasks) > 0
+
+    async def drain(self):
+        """Wait for dispatched listeners to finish"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def add_member(self, name: Optional[str] = None, **options) -> FakeMember:
+        user_id: int = self.next_id()
+        member: FakeMember = FakeMember(self, user_id, name or f"user{len(self._members)}", **options)
+        self._members[user_id] = member
+        return member
+
+    def add_category(self, name: str, overwrites: Optional[dict] = None, position: int = 0) -> FakeCategoryChannel:
+        category: FakeCategoryChannel = FakeCategoryChannel(self, self.next_id(), name, overwrites, position)
+        return self._add_channel(category)
+
+    def add_text_channel(self, name: str, category: Optional[FakeCategoryChannel] = None, overwrites: Optional[dict] = None,
+                         created_at: Optional[datetime] = None) -> FakeTextChannel:
+        channel: FakeTextChannel = FakeTextChannel(self, self.next_id(created_at), name, category.id if category is not None else None, overwrites)
+        return self._add_channel(channel)
+
+    def add_voice_channel(self, name: str, category: Optional[FakeCategoryChannel] = None, overwrites: Optional[dict] = None,
+                          created_at: Optional[datetime] = None) -> FakeVoiceChannel:
+        channel: FakeVoiceChannel = FakeVoiceChannel(self, self.next_id(created_at), name, category.id if category is not None else None, overwrites)
+        return self._add_channel(channel)
+
+    def add_private_channel(self, owner: FakeMember, category: FakeCategoryChannel, guests: tuple = (),
+                            created_at: Optional[datetime] = None) -> tuple[FakeTextChannel, FakeVoiceChannel]:
+        """Seed a private channel pair as the cog would have created it, without any REST call"""
+        allow: discord.PermissionOverwrite = discord.PermissionOverwrite(view_channel=True)
+        overwrites: dict = {**category.overwrites, owner: allow, **{guest: allow for guest in guests}}
+        return (self.add_text_channel(f"pvch-{owner.name}", category, overwrites, created_at),
+                self.add_voice_channel(f"pvch-{owner.name}", category, overwrites, created_at))
+
+    def remove_channel(self, channel: discord.abc.GuildChannel):
+        channel = self._server.pop(channel.id)
+        self._server_children[channel.category_id] -= 1
+        if self._channels.pop(channel.id, None) is not None:
+            self._children.get(channel.category_id, {}).pop(channel.id, None)
+            self.dispatch("guild_channel_delete", channel)
+
+    def _add_server_channel(self, channel: discord.abc.GuildChannel):
+        self._server[channel.id] = channel
+        self._server_children[channel.category_id] += 1
+
+    def _add_channel(self, channel: discord.abc.GuildChannel) -> Any:
+        if channel.id not in self._server:  # Seeded, not created through the REST simulator
+            self._add_server_channel(channel)
+        self._channels[channel.id] = channel
+        self._children.setdefault(channel.category_id, {})[channel.id] = channel
+        return channel
+
+
+class FakeResponse:
+    """Initial interaction response, which discord.py sends outside the REST queue"""
+    def __init__(self, interaction: 'FakeInteraction'):
+        self.interaction: FakeInteraction = interaction
+        self._done: bool = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self, route: str, options: dict):
+        if self._done:
+            raise http_error(discord.InteractionResponded, 400, "Interaction has already been responded to")
+        await self.interaction.guild.rest.request(route, ("interaction", self.interaction.id))
+        self._done = True
+        self.interaction.record(route, options)
+
+    async def defer(self, **options):
+        await self._respond("interaction.defer", options)
+
+    async def send_message(self, content: Optional[str] = None, **options):
+        await self._respond("interaction.send_message", options)
+
+    async def edit_message(self, **options):
+        await self._respond("interaction.edit_message", options)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: 'FakeInteraction'):
+        self.interaction: FakeInteraction = interaction
+
+    async def send(self, content: Optional[str] = None, **options):
+        await self.interaction.guild.rest.request("webhook.send", ("interaction", self.interaction.id))
+        self.interaction.record("webhook.send", options)
+
+
+class FakeInteraction:
+    """Slash command / component interaction invoked by `user` in `channel`"""
+    def __init__(self, guild: FakeGuild, user: FakeMember, channel: discord.abc.GuildChannel):
+        self.id: int = guild.next_id()
+        self.guild: FakeGuild = guild
+        self.guild_id: int = guild.id
+        self.user: FakeMember = user
+        self.channel: discord.abc.GuildChannel = channel
+        self.command: Optional[Any] = None
+        self.extras: dict[str, Any] = {}
+        self.responses: list[tuple[str, dict]] = []  # [(route, options)]
+        self.response: FakeResponse = FakeResponse(self)
+        self.followup: FakeFollowup = FakeFollowup(self)
+
+    def record(self, route: str, options: dict):
+        self.responses.append((route, options))
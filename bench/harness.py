@@ -0,0 +1,109 @@
+"""Wiring of the private channel cog to a fake guild, shared by the benchmarks"""
+import discord
+from discord.ext import commands
+
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from typing import Optional
+
+from Cogs.private_channel import PrivateChannelBot, partitions
+from utils.guild_config import GuildConfig
+from utils.guild_partition import GuildPartition
+from utils.pvch_store import PvchRecord, PvchStore, CsvJournalStore, SqliteStore, WriteBehindStore
+from utils.rest_queue import rest_queue
+from bench.fakes import RestSimulator, FakeGuild, FakeMember, FakeCategoryChannel, FakeTextChannel
+
+from settings import INACTIVE_DAYS, PVCH_WRITE_BEHIND
+
+
+def quiet_logs(level: str = "WARNING"):
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+
+def latency_summary(samples: list[float]) -> dict[str, float]:
+    """Exact percentiles of latency samples in seconds"""
+    if len(samples) == 0:
+        return {"count": 0}
+    ordered: list[float] = sorted(samples)
+    def pick(q: float) -> float:
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return {"count": len(ordered), "mean": sum(ordered) / len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+
+class Harness:
+    """A fake guild with the cog attached, its store living in a temporary directory
+
+    The fake guild's partition is registered with the cog while started, so only one harness can be started at a time.
+    """
+    def __init__(self, rest: Optional[RestSimulator] = None, backend: str = "csv", gateway_delay: float = 0.0):
+        self.rest: RestSimulator = rest if rest is not None else RestSimulator()
+        self.backend: str = backend
+        self.tmpdir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory(prefix="pvch-bench-")
+        self.guild: FakeGuild = FakeGuild(self.rest, gateway_delay=gateway_delay)
+        self.category: FakeCategoryChannel = self.guild.add_category("pvch", {self.guild.default_role: discord.PermissionOverwrite(view_channel=False)})
+        self.lobby: FakeTextChannel = self.guild.add_text_channel("general")
+        self.bot: commands.Bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        self.cog: PrivateChannelBot = PrivateChannelBot(self.bot)
+        self.partition: Optional[GuildPartition] = None
+
+    def open_store(self, write_behind: bool = False) -> PvchStore:
+        if self.backend == "sqlite":
+            store: PvchStore = SqliteStore(os.path.join(self.tmpdir.name, "pvch_data.sqlite3"), self.guild.id)
+        else:
+            store: PvchStore = CsvJournalStore(os.path.join(self.tmpdir.name, "pvch_data.csv"), os.path.join(self.tmpdir.name, "pvch_data.journal"))
+        return WriteBehindStore(store) if write_behind else store
+
+    def seed(self, count: int, guests: int = 0, expired: float = 0.0, cold: float = 0.0) -> list[FakeMember]:
+        """Create `count` private channels and persist them, returns their owners
+
+        `expired` is the share of channels inactive for longer than INACTIVE_DAYS, and `cold` the share
+        whose activity was never persisted (the first expiry check has to look up their history).
+        """
+        now: datetime = datetime.now(timezone.utc)
+        store: PvchStore = self.open_store()
+        owners: list[FakeMember] = []
+        invitees: list[FakeMember] = [self.guild.add_member() for _ in range(guests)]
+        for i in range(count):
+            owner: FakeMember = self.guild.add_member()
+            is_expired: bool = i < count * expired
+            created_at: datetime = now - timedelta(days=INACTIVE_DAYS + 1 if is_expired else 1)
+            txt_channel, vc_channel = self.guild.add_private_channel(owner, self.category, tuple(invitees), created_at)
+            last_active_at: Optional[float] = None if (i % 100) < cold * 100 else created_at.timestamp() + 60
+            store.put(PvchRecord(owner.id, txt_channel.id, vc_channel.id, last_active_at=last_active_at, guests={guest.id for guest in invitees}))
+            owners.append(owner)
+        store.compact()
+        store.close()
+        return owners
+
+    def start(self):
+        """Do what on_ready does, against the fake guild"""
+        self.partition = GuildPartition(GuildConfig(self.guild.id, self.category.id), self.open_store(PVCH_WRITE_BEHIND))
+        self.partition.category_allocator.path = os.path.join(self.tmpdir.name, "overflow_categories.json")
+        self.partition.attach(self.guild)
+        self.partition.load()
+        partitions[self.guild.id] = self.partition
+        for user_id in self.partition.registry:
+            self.partition.schedule_expiry(user_id)
+        self.guild.subscribe("guild_channel_delete", self.cog.on_guild_channel_delete)
+        self.guild.subscribe("guild_channel_update", self.cog.on_guild_channel_update)
+
+    async def settle(self):
+        """Wait for background tasks of the cog and dispatched gateway events"""
+        while self.cog.background_tasks or self.guild.busy:
+            await self.guild.drain()
+            if self.cog.background_tasks:
+                await asyncio.gather(*self.cog.background_tasks, return_exceptions=True)
+
+    async def stop(self):
+        await self.settle()
+        rest_queue.stop()
+        if self.partition is not None:
+            self.partition.stop()
+            self.partition.pvch_data_csv.close()
+            partitions.pop(self.guild.id, None)
+            self.partition = None
+        self.tmpdir.cleanup()
@@ -0,0 +1,217 @@
+"""Offline benchmarks of the private channel hot paths against a fake guild
+
+Usage: python -m bench.run_bench [--output results.json] [--only store,sweep,...]
+
+Results are written as JSON so runs of different versions can be compared.
+"""
+import discord
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from Cogs.private_channel import PrivateChannel
+from utils.channel_archive import ArchiveInfo, ChannelArchiver
+from utils.rw_pvch_data import PvchDataCsv
+from bench.fakes import RestSimulator, FakeInteraction, FakeMember
+from bench.harness import Harness, latency_summary, quiet_logs
+
+from settings import LOW_MEMORY_MODE, PVCH_STORAGE_BACKEND, PVCH_WRITE_BEHIND
+
+
+def result(name: str, seconds: float, ops: int, rest: Optional[RestSimulator] = None, **extra: Any) -> dict[str, Any]:
+    entry: dict[str, Any] = {"name": name, "seconds": seconds, "ops": ops, "ops_per_sec": ops / seconds if seconds > 0 else None, **extra}
+    if rest is not None:
+        entry["rest_calls"] = dict(rest.calls)
+        entry["rate_limited"] = dict(rest.rate_limited)
+    return entry
+
+
+async def bench_store(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """PvchDataCsv.read of the whole store, then single deletions through PvchDataCsv.update"""
+    results: list[dict[str, Any]] = []
+    for backend in args.backends:
+        for count in args.sizes:
+            harness: Harness = Harness(backend=backend)
+            harness.seed(count, guests=2)
+            data: PvchDataCsv = PvchDataCsv(harness.open_store(PVCH_WRITE_BEHIND))
+
+            started: float = time.perf_counter()
+            pvch_data: dict[int, PrivateChannel] = data.read([harness.category])
+            results.append(result("store.read", time.perf_counter() - started, count, backend=backend, records=count, write_behind=PVCH_WRITE_BEHIND))
+
+            samples: list[float] = []
+            for user_id in list(pvch_data)[:args.update_ops]:
+                del pvch_data[user_id]
+                started = time.perf_counter()
+                data.update(pvch_data)
+                samples.append(time.perf_counter() - started)
+            results.append(result("store.update", sum(samples), len(samples), backend=backend, records=count, write_behind=PVCH_WRITE_BEHIND,
+                                  latency=latency_summary(samples)))
+            data.close()
+            harness.tmpdir.cleanup()
+    return results
+
+async def bench_sweep(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """check_pv_exp over every channel, a share of them expired and a share never checked since the cold start"""
+    results: list[dict[str, Any]] = []
+    for count in args.sweep_sizes:
+        rest: RestSimulator = RestSimulator(args.latency, args.bucket_limit, args.bucket_window)
+        harness: Harness = Harness(rest, args.backend)
+        harness.seed(count, expired=args.expired, cold=args.cold)
+        harness.start()
+        rest.reset()
+        try:
+            started: float = time.perf_counter()
+            await harness.cog.check_pv_exp(harness.partition, list(harness.partition.registry))
+            await harness.settle()
+            results.append(result("check_pv_exp", time.perf_counter() - started, count, rest, channels=count, expired=harness.partition.last_sweep.expired,
+                                  failed=harness.partition.last_sweep.failed, remaining=len(harness.partition.registry)))
+        finally:
+            await harness.stop()
+    return results
+
+async def bench_invite(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """PrivateChannel.invite_user with 25 members, one fresh channel per repetition"""
+    rest: RestSimulator = RestSimulator(args.latency, args.bucket_limit, args.bucket_window)
+    harness: Harness = Harness(rest, args.backend)
+    owners: list[FakeMember] = harness.seed(args.repeat)
+    harness.start()
+    invitees: list[FakeMember] = [harness.guild.add_member() for _ in range(25)]
+    rest.reset()
+    samples: list[float] = []
+    try:
+        for owner in owners:
+            started: float = time.perf_counter()
+            await harness.partition.registry.get(owner.id).invite_user(invitees)
+            samples.append(time.perf_counter() - started)
+        return [result("invite_user", sum(samples), len(samples), rest, users=len(invitees), latency=latency_summary(samples))]
+    finally:
+        await harness.stop()
+
+async def bench_create(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """A burst of /pvch_create from different members at the same moment"""
+    rest: RestSimulator = RestSimulator(args.latency, args.bucket_limit, args.bucket_window)
+    harness: Harness = Harness(rest, args.backend)
+    harness.start()
+    members: list[FakeMember] = [harness.guild.add_member() for _ in range(args.burst)]
+    samples: list[float] = []
+
+    async def create(member: FakeMember):
+        started: float = time.perf_counter()
+        await harness.cog.pvch_create.callback(harness.cog, FakeInteraction(harness.guild, member, harness.lobby))
+        samples.append(time.perf_counter() - started)
+
+    try:
+        started: float = time.perf_counter()
+        await asyncio.gather(*[create(member) for member in members])
+        elapsed: float = time.perf_counter() - started
+        await harness.settle()
+        return [result("pvch_create.burst", elapsed, len(members), rest, created=len(harness.partition.registry),
+                       categories=len(harness.partition.category_allocator.categories()),
+                       latency=latency_summary(samples), settled=time.perf_counter() - started)]
+    finally:
+        await harness.stop()
+
+async def bench_info(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """/pvch_info in a channel with a few guests, in a guild with many members"""
+    rest: RestSimulator = RestSimulator(args.latency, args.bucket_limit, args.bucket_window)
+    harness: Harness = Harness(rest, args.backend)
+    owners: list[FakeMember] = harness.seed(1, guests=10)
+    for _ in range(args.members - len(harness.guild.members)):
+        harness.guild.add_member()
+    harness.start()
+    rest.reset()
+    pvch: PrivateChannel = harness.partition.registry.get(owners[0].id)
+    samples: list[float] = []
+    try:
+        for _ in range(args.repeat):
+            started: float = time.perf_counter()
+            await harness.cog.pvch_info.callback(harness.cog, FakeInteraction(harness.guild, owners[0], pvch.txt_channel))
+            samples.append(time.perf_counter() - started)
+        return [result("pvch_info", sum(samples), len(samples), rest, members=len(harness.guild.members), guests=len(pvch.guests),
+                       low_memory_mode=LOW_MEMORY_MODE, latency=latency_summary(samples))]
+    finally:
+        await harness.stop()
+
+async def bench_archive(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """ChannelArchiver.archive of channels with long histories, all started at once"""
+    rest: RestSimulator = RestSimulator(args.latency, args.bucket_limit, args.bucket_window)
+    harness: Harness = Harness(rest, args.backend)
+    owners: list[FakeMember] = harness.seed(args.archive_channels)
+    harness.start()
+    pvchs: list[PrivateChannel] = [harness.partition.registry.get(owner.id) for owner in owners]
+    for pvch in pvchs:
+        for i in range(args.archive_messages):
+            pvch.txt_channel.add_message(harness.guild.get_member(pvch.user_id), f"message {i}")
+    archiver: ChannelArchiver = ChannelArchiver(os.path.join(harness.tmpdir.name, "archive"))
+    rest.reset()
+    try:
+        started: float = time.perf_counter()
+        archives: list[ArchiveInfo] = await asyncio.gather(*[archiver.archive(pvch) for pvch in pvchs])
+        elapsed: float = time.perf_counter() - started
+        messages: int = sum(info.messages for info in archives)
+        return [result("archive", elapsed, messages, rest, channels=len(archives), messages_per_channel=args.archive_messages,
+                       bytes=sum(info.offset for info in archives), concurrency=archiver.concurrency, page_size=archiver.page_size)]
+    finally:
+        await harness.stop()
+
+
+BENCHMARKS: dict[str, Callable] = {"store": bench_store, "sweep": bench_sweep, "invite": bench_invite, "create": bench_create, "info": bench_info,
+                                   "archive": bench_archive}
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args() -> argparse.Namespace:
+    def int_list(value: str) -> list[int]:
+        return [int(v) for v in value.split(",")]
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Offline benchmarks of the private channel hot paths")
+    parser.add_argument("--only", type=lambda v: v.split(","), default=list(BENCHMARKS), help=f"comma separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--sizes", type=int_list, default=[10, 1000, 10000, 100000], help="record counts of the store benchmark")
+    parser.add_argument("--backends", type=lambda v: v.split(","), default=["csv", "sqlite"], help="store backends of the store benchmark")
+    parser.add_argument("--backend", default=PVCH_STORAGE_BACKEND, help="store backend of the other benchmarks")
+    parser.add_argument("--update-ops", type=int, default=100, help="deletions timed per store size")
+    parser.add_argument("--sweep-sizes", type=int_list, default=[100, 1000], help="channel counts of the expiry sweep benchmark")
+    parser.add_argument("--expired", type=float, default=0.1, help="share of expired channels in the sweep")
+    parser.add_argument("--cold", type=float, default=0.5, help="share of channels without persisted activity in the sweep")
+    parser.add_argument("--burst", type=int, default=20, help="concurrent /pvch_create calls")
+    parser.add_argument("--members", type=int, default=100000, help="guild size of the /pvch_info benchmark")
+    parser.add_argument("--archive-channels", type=int, default=4, help="channels of the archive benchmark")
+    parser.add_argument("--archive-messages", type=int, default=5000, help="messages per channel of the archive benchmark")
+    parser.add_argument("--repeat", type=int, default=10, help="repetitions of the invite and info benchmarks")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated REST latency in seconds")
+    parser.add_argument("--bucket-limit", type=int, default=5, help="requests per rate limit bucket and window (0 disables)")
+    parser.add_argument("--bucket-window", type=float, default=1.0, help="rate limit window in seconds")
+    return parser.parse_args()
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    report: dict[str, Any] = {"revision": git_revision(), "started_at": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                              "discord.py": discord.__version__, "params": {k: v for k, v in vars(args).items() if k != "output"}, "results": []}
+    for name in args.only:
+        report["results"].extend(await BENCHMARKS[name](args))
+    return report
+
+def main():
+    quiet_logs()
+    args: argparse.Namespace = parse_args()
+    output: str = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Soak test replaying a mix of concurrent interactions against the cog and a fake guild
+
+Usage: python -m bench.soak [--rate 50] [--duration 30] [--mix create=4,invite=3,delete=2,admin_delete=1]
+
+Interactions arrive at the target rate regardless of how fast earlier ones complete. Once everything
+has settled, the invariants below are checked and a JSON report with throughput and tail latency is printed.
+- No owner has more than one text/voice channel pair
+- The store holds exactly the registered private channels
+- Every channel in the private channel categories belongs to a registered private channel
+- The guests of every private channel match the overwrites Discord ended up with
+"""
+import discord
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from Cogs.private_channel import PrivateChannel
+from utils.guild_partition import GuildPartition
+from utils.pvch_store import PvchRecord, PvchStore
+from ui.interaction_ui import InviteUserSelectItem
+from bench.fakes import RestSimulator, FakeInteraction, FakeMember
+from bench.harness import Harness, latency_summary, quiet_logs
+
+from settings import PVCH_STORAGE_BACKEND
+
+
+class Soak:
+    def __init__(self, harness: Harness, users: list[FakeMember], rng: random.Random):
+        self.harness: Harness = harness
+        self.users: list[FakeMember] = users
+        self.rng: random.Random = rng
+        self.latency: dict[str, list[float]] = {}  # {action: [seconds]}
+        self.errors: dict[str, int] = {}  # {action: unhandled exceptions}
+        self.actions: dict[str, Callable[[FakeMember], Awaitable[None]]] = {"create": self.create, "invite": self.invite,
+                                                                            "delete": self.delete, "admin_delete": self.admin_delete}
+
+    def interaction(self, user: FakeMember, channel: Optional[discord.abc.GuildChannel] = None) -> FakeInteraction:
+        return FakeInteraction(self.harness.guild, user, channel if channel is not None else self.harness.lobby)
+
+    @staticmethod
+    def sent_view(ctx: FakeInteraction) -> Optional[discord.ui.View]:
+        return next((options["view"] for _, options in reversed(ctx.responses) if "view" in options), None)
+
+    async def create(self, user: FakeMember):
+        await self.harness.cog.pvch_create.callback(self.harness.cog, self.interaction(user))
+
+    async def invite(self, user: FakeMember):
+        ctx: FakeInteraction = self.interaction(user)
+        await self.harness.cog.pvch_invite.callback(self.harness.cog, ctx)
+        if (view := self.sent_view(ctx)) is not None:
+            item: InviteUserSelectItem = view.children[0]
+            item.item._values = self.rng.sample(self.users, self.rng.randint(1, 5))  # What discord.py stores when the select interaction arrives
+            await item.callback(self.interaction(user))
+
+    async def delete(self, user: FakeMember):
+        ctx: FakeInteraction = self.interaction(user)
+        await self.harness.cog.pvch_delete.callback(self.harness.cog, ctx)
+        if (view := self.sent_view(ctx)) is not None:
+            await view.children[0].callback(self.interaction(user))  # DeleteButton
+
+    async def admin_delete(self, user: FakeMember):
+        ctx: FakeInteraction = self.interaction(user)
+        await self.harness.cog.pvch_admin_delete.callback(self.harness.cog, ctx, self.rng.choice(self.users))
+        if (view := self.sent_view(ctx)) is not None:
+            await view.children[0].callback(self.interaction(user))  # DeleteButton
+
+    async def run_action(self, action: str, user: FakeMember):
+        started: float = time.perf_counter()
+        try:
+            await self.actions[action](user)
+        except Exception:
+            self.errors[action] = self.errors.get(action, 0) + 1
+        self.latency.setdefault(action, []).append(time.perf_counter() - started)
+
+    async def run(self, mix: dict[str, int], rate: float, duration: float) -> float:
+        """Fire interactions at `rate` per second for `duration` seconds, returns the time until all of them finished"""
+        actions: list[str] = list(mix)
+        weights: list[int] = list(mix.values())
+        tasks: list[asyncio.Task] = []
+        started: float = time.perf_counter()
+        for i in range(int(rate * duration)):
+            if (delay := started + i / rate - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            action: str = self.rng.choices(actions, weights)[0]
+            tasks.append(asyncio.create_task(self.run_action(action, self.rng.choice(self.users))))
+        await asyncio.gather(*tasks)
+        await self.harness.settle()
+        return time.perf_counter() - started
+
+    def check_invariants(self) -> list[str]:
+        violations: list[str] = []
+        part: GuildPartition = self.harness.partition
+        categories: set[int] = {category.id for category in part.category_allocator.categories()}
+        channels: list[discord.abc.GuildChannel] = [ch for ch in self.harness.guild.channels if ch.category_id in categories]
+
+        pairs: dict[str, int] = {}
+        for channel in channels:
+            pairs[channel.name] = pairs.get(channel.name, 0) + 1
+        for name, count in pairs.items():
+            if count > 2:
+                violations.append(f"duplicate channels: {count} channels named {name}")
+
+        for channel in channels:
+            if part.registry.get_by_channel(channel.id) is None and not part.channel_pool.is_pool_channel(channel.id):
+                violations.append(f"orphan channel: {channel.name} ({channel.id})")
+
+        for pvch in part.registry.values():
+            if self.harness.guild.get_channel(pvch.txt_channel.id) is None or self.harness.guild.get_channel(pvch.vc_channel.id) is None:
+                violations.append(f"registered channel is gone: {pvch}")
+            elif pvch.guests != PrivateChannel(pvch.user_id, self.harness.guild.get_channel(pvch.txt_channel.id), pvch.vc_channel).guests:
+                violations.append(f"guests differ from overwrites: {pvch}")  # Compared with the cached channel, which every update has reached by now
+
+        part.pvch_data_csv.flush()
+        store: PvchStore = self.harness.open_store()
+        records: dict[int, PvchRecord] = store.load()
+        store.close()
+        for user_id in records.keys() ^ set(part.registry.keys()):
+            violations.append(f"store and registry differ: user_id={user_id} in {'store' if user_id in records else 'registry'} only")
+        for user_id in records.keys() & set(part.registry.keys()):
+            pvch: PrivateChannel = part.registry.get(user_id)
+            record: PvchRecord = records[user_id]
+            if (record.txt_channel_id, record.vc_channel_id) != (pvch.txt_channel.id, pvch.vc_channel.id):
+                violations.append(f"store and registry differ: {record} != {pvch}")
+            elif self.harness.backend == "sqlite" and record.guests != pvch.guests:  # The CSV backend does not persist guests
+                violations.append(f"stored guests differ: {record}")
+        return violations
+
+
+def parse_args() -> argparse.Namespace:
+    def mix(value: str) -> dict[str, int]:
+        return {action: int(weight) for action, weight in (item.split("=") for item in value.split(","))}
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Soak test of the private channel commands against a fake guild")
+    parser.add_argument("--rate", type=float, default=50.0, help="interactions per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep firing interactions")
+    parser.add_argument("--users", type=int, default=200, help="members taking part")
+    parser.add_argument("--mix", type=mix, default={"create": 4, "invite": 3, "delete": 2, "admin_delete": 1}, help="action weights")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the interaction sequence")
+    parser.add_argument("--backend", default=PVCH_STORAGE_BACKEND, help="store backend")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated REST latency in seconds")
+    parser.add_argument("--bucket-limit", type=int, default=5, help="requests per rate limit bucket and window (0 disables)")
+    parser.add_argument("--bucket-window", type=float, default=1.0, help="rate limit window in seconds")
+    parser.add_argument("--gateway-delay", type=float, default=0.1, help="seconds until an edit reaches the cached channel")
+    return parser.parse_args()
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    harness: Harness = Harness(RestSimulator(args.latency, args.bucket_limit, args.bucket_window), args.backend, args.gateway_delay)
+    harness.start()
+    soak: Soak = Soak(harness, [harness.guild.add_member() for _ in range(args.users)], random.Random(args.seed))
+    try:
+        elapsed: float = await soak.run(args.mix, args.rate, args.duration)
+        completed: int = sum(len(samples) for samples in soak.latency.values())
+        violations: list[str] = soak.check_invariants()
+        return {"params": vars(args), "elapsed": elapsed, "completed": completed, "throughput": completed / elapsed,
+                "latency": {action: latency_summary(samples) for action, samples in soak.latency.items()},
+                "errors": soak.errors, "private_channels": len(harness.partition.registry), "rest_calls": dict(harness.rest.calls),
+                "rate_limited": dict(harness.rest.rate_limited), "violations": violations}
+    finally:
+        await harness.stop()
+
+def main():
+    quiet_logs("ERROR")
+    report: dict[str, Any] = asyncio.run(run(parse_args()))
+    print(json.dumps(report, indent=2))
+    raise SystemExit(1 if len(report["violations"]) > 0 else 0)
+
+if __name__ == "__main__":
+    main()
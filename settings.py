@@ -10,6 +10,63 @@ MODERATOR_ROLE_ID: int = 0000000000000000000
 INACTIVE_DAYS: int = 7
 INACTIVE_SB_DAYS: int = 30
 
+# Guilds served by the bot, a JSON list like [{"guild_id": ..., "category_id": ..., "owner_role_id": ..., "moderator_role_id": ...}]
+# Without the file, only the guild above is served with the settings above
+GUILDS_CONFIG_PATH: str = "guilds.json"
+
+SHARDING: bool = False  # Run as AutoShardedBot
+SHARD_COUNT: int = 0  # Total shards of the bot across all processes (0 uses the count recommended by Discord)
+SHARD_IDS: list[int] = []  # Shards run by this process (empty runs every shard), e.g. [0, 1] and [2, 3] in two processes sharing the store
+
 DOCS_URL: str = "https://"
 
-PVCH_DATA_FILE_PATH: str = "data/pvch_data.csv"
\ No newline at end of file
+PVCH_DATA_FILE_PATH: str = "data/pvch_data.csv"
+
+PVCH_JOURNAL_FILE_PATH: str = "data/pvch_data.journal"
+PVCH_JOURNAL_FSYNC: str = "always"  # "always", "interval" or "never"
+PVCH_JOURNAL_FSYNC_INTERVAL: float = 1.0  # Seconds between fsyncs when PVCH_JOURNAL_FSYNC is "interval"
+PVCH_COMPACT_INTERVAL_MINUTES: int = 60
+PVCH_COMPACT_THRESHOLD: int = 1000  # Journal records before compaction is due
+
+PVCH_STORAGE_BACKEND: str = "csv"  # "csv" or "sqlite"
+PVCH_SQLITE_PATH: str = "data/pvch_data.sqlite3"
+PVCH_WRITE_BEHIND: bool = True  # Write store changes from a worker thread instead of the event loop
+PVCH_WRITE_BEHIND_WINDOW: float = 0.5  # Seconds changes are collected before they are written (lost on a crash, not on shutdown)
+
+PVCH_ACTIVITY_PERSIST_INTERVAL: int = 600  # Minimum seconds between persisting a channel's activity time
+
+PVCH_EXPIRY_CHECK_CONCURRENCY: int = 8
+PVCH_EXPIRY_DELETE_CONCURRENCY: int = 4
+
+PVCH_ARCHIVE_ENABLED: bool = False  # Archive the text channel history of expired private channels before deleting them
+PVCH_ARCHIVE_DIR: str = "data/archive"  # One gzip-compressed JSON Lines file per channel under <dir>/<guild_id>/
+PVCH_ARCHIVE_CONCURRENCY: int = 2  # Channels archived at once
+PVCH_ARCHIVE_PAGE_SIZE: int = 100  # Messages per compressed chunk and resume checkpoint
+
+PVCH_POOL_SIZE: int = 0  # Pre-created private channel pairs kept ready (0 disables the pool)
+PVCH_POOL_REFILL_INTERVAL: float = 10.0  # Seconds between pool channel pair creations
+PVCH_POOL_CHANNEL_NAME: str = "pvch-pool"
+
+PVCH_CATEGORY_CAPACITY: int = 50  # Channels per category (Discord limit)
+PVCH_OVERFLOW_CATEGORIES_PATH: str = "data/overflow_categories.json"  # Ids of the overflow categories the bot created, one file per guild
+
+PVCH_RECONCILE_DELETE_ORPHANS: bool = False  # Delete channels in the private channel categories that have no record
+PVCH_RECONCILE_CONCURRENCY: int = 4
+
+PVCH_RELOAD_DRAIN_TIMEOUT: float = 10.0  # Seconds /pvch_admin_reload waits for in-flight commands and REST requests
+
+COMMAND_TREE_HASH_PATH: str = "data/command_tree.sha256"  # Hash of the last synced command tree
+
+LOW_MEMORY_MODE: bool = False  # No presences, no member chunking, members fetched on demand
+MEMBER_CACHE_TTL: float = 300.0  # Seconds an on-demand fetched member is kept in low memory mode
+MEMBER_CACHE_SIZE: int = 1024
+
+REST_QUEUE_WORKERS: int = 8
+REST_QUEUE_BUCKET_CONCURRENCY: int = 1  # Concurrent requests per channel
+REST_QUEUE_CREATE_CONCURRENCY: int = 2  # Concurrent channel creations per guild, so both halves of a private channel are created at once
+REST_QUEUE_MAX_RETRIES: int = 3
+REST_QUEUE_RETRY_BACKOFF: float = 1.0  # Seconds, doubled on every retry
+
+METRICS_ENABLED: bool = False
+METRICS_HTTP_HOST: str = "127.0.0.1"
+METRICS_HTTP_PORT: int = 0  # Serve Prometheus metrics on http://METRICS_HTTP_HOST:METRICS_HTTP_PORT/metrics (0 disables)
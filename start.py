@@ -1,24 +1,65 @@
+import argparse
 import asyncio
 import discord
+import signal
 from discord.ext import commands
 
-from settings import TOKEN
+from settings import TOKEN, LOW_MEMORY_MODE, SHARDING, SHARD_COUNT, SHARD_IDS
+
+def parse_shard_ids(value: str) -> list[int]:
+  """Parse "0-3" or "0,2,4" into shard ids"""
+  shard_ids: list[int] = []
+  for part in value.split(","):
+    first, _, last = part.partition("-")
+    shard_ids.extend(range(int(first), int(last or first) + 1))
+  return shard_ids
+
+def parse_args() -> argparse.Namespace:
+  parser: argparse.ArgumentParser = argparse.ArgumentParser(description="PrivateChannelBot")
+  parser.add_argument("--shards", type=parse_shard_ids, default=SHARD_IDS or None,
+                      help='shards run by this process, e.g. "0-3" (implies sharding, requires the shard count)')
+  parser.add_argument("--shard-count", type=int, default=SHARD_COUNT or None, help="total shards across all processes")
+  return parser.parse_args()
 
 def main():
+  args: argparse.Namespace = parse_args()
   intents: discord.Intents = discord.Intents.none()
   intents.guilds = True
   intents.members = True
   intents.presences = True
+  intents.voice_states = True
   intents.messages = True
   intents.message_content = True
 
-  bot: commands.Bot = commands.Bot(command_prefix="/", intents=intents)
+  options: dict = {"command_prefix": "/", "intents": intents}
+  if LOW_MEMORY_MODE:
+    # Only members in voice channels are cached, everyone else is fetched on demand
+    intents.presences = False
+    member_cache_flags: discord.MemberCacheFlags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    options.update(member_cache_flags=member_cache_flags, chunk_guilds_at_startup=False)
+
+  if SHARDING or args.shards is not None:
+    if args.shards is not None and args.shard_count is None:
+      raise SystemExit("--shard-count (SHARD_COUNT) is required to run a subset of the shards")
+    # Processes running different shard ranges serve disjoint guilds, so they can share the store
+    bot: commands.Bot = commands.AutoShardedBot(shard_ids=args.shards, shard_count=args.shard_count, **options)
+  else:
+    bot: commands.Bot = commands.Bot(**options)
 
-  async def setup_bot():
-    await bot.load_extension("Cogs.private_channel")
-  asyncio.get_event_loop().run_until_complete(setup_bot())
+  async def run_bot():
+    # Close the bot on SIGINT/SIGTERM so the cog is unloaded and queued store writes are flushed
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+      try:
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(bot.close()))
+      except NotImplementedError:  # Windows
+        pass
 
-  bot.run(TOKEN)
+    async with bot:
+      await bot.load_extension("Cogs.private_channel")
+      await bot.start(TOKEN)
+  asyncio.run(run_bot())
 
 if __name__ == "__main__":
-  main()
\ No newline at end of file
+  main()
@@ -1,58 +1,136 @@
 from __future__ import annotations
 import discord
-from discord.ui import View, UserSelect, Button
+from discord.ui import View, UserSelect, Button, DynamicItem
+
+import re
+from typing import Optional
 
 from Cogs import private_channel
-from utils.embed_template import info_embed_template
+from utils.embed_template import info_embed_template, error_embed_template
+from utils.metrics import metrics
 
 
-class InviteUserSelect(View):
+async def disable_prompt(ctx: discord.Interaction, view: View):
+    """Disable every component of the prompt the interaction came from"""
+    for item in view.children:
+        item.disabled = True
+    view.stop()  # Nothing left to dispatch, keeps the view out of the view store
+    await ctx.response.edit_message(view=view)
+
+async def resolve_pvch(ctx: discord.Interaction, user_id: int, channel_id: Optional[int]) -> Optional['private_channel.PrivateChannel']:
+    """Look up the private channel a component refers to, telling the user when it is gone
+
+    The prompts never time out, so one shown for a channel that was deleted since must not act on the owner's new channel.
+    `channel_id` is None for prompts sent before the text channel id was part of the custom_id.
+    """
+    part: Optional['private_channel.GuildPartition'] = private_channel.partitions.get(ctx.guild_id)
+    pvch: Optional['private_channel.PrivateChannel'] = part.registry.get(user_id) if part is not None else None
+    if pvch is None or pvch.txt_channel.id != channel_id:
+        await ctx.followup.send(embed=error_embed_template("プライベートチャンネルが見つかりませんでした。"), ephemeral=True)
+        return None
+    return pvch
+
+
+class InviteUserSelectItem(DynamicItem[UserSelect], template=r"pvch:invite:(?P<user_id>[0-9]+)(?::(?P<channel_id>[0-9]+))?"):
     """User invitation select box"""
-    def __init__(self, pvch: 'private_channel.PrivateChannel'):
-        super().__init__()
-        self.pvch: 'private_channel.PrivateChannel' = pvch
+    def __init__(self, user_id: int, channel_id: Optional[int]):
+        super().__init__(UserSelect(custom_id=f"pvch:invite:{user_id}:{channel_id}", max_values=25, placeholder="招待するユーザーを指定"))
+        self.user_id: int = user_id
+        self.channel_id: Optional[int] = channel_id
 
-    @discord.ui.select(cls=UserSelect, max_values=25, placeholder="招待するユーザーを指定")
-    async def selectMenu(self, ctx: discord.Interaction, select: UserSelect):
-        select.disabled = True
-        await ctx.response.edit_message(view=self)
-        await self.pvch.invite_user(select.values)
-        await ctx.followup.send(embed=info_embed_template("プライベートチャンネルをご確認ください。"), ephemeral=True)
+    @classmethod
+    async def from_custom_id(cls, ctx: discord.Interaction, item: UserSelect, match: re.Match[str]) -> InviteUserSelectItem:
+        return cls(int(match["user_id"]), int(match["channel_id"]) if match["channel_id"] else None)
 
+    async def callback(self, ctx: discord.Interaction):
+        with metrics.timer("pvch_view_seconds", view="InviteUserSelect"):
+            await disable_prompt(ctx, self.view)
+            if (pvch := await resolve_pvch(ctx, self.user_id, self.channel_id)) is None:
+                return
+            await pvch.invite_user(self.item.values)
+            await ctx.followup.send(embed=info_embed_template("プライベートチャンネルをご確認ください。"), ephemeral=True)
 
-class KickUserSelect(View):
+
+class KickUserSelectItem(DynamicItem[UserSelect], template=r"pvch:kick:(?P<user_id>[0-9]+)(?::(?P<channel_id>[0-9]+))?"):
     """User kick select box"""
-    def __init__(self, pvch: 'private_channel.PrivateChannel'):
-        super().__init__()
-        self.pvch: 'private_channel.PrivateChannel' = pvch
+    def __init__(self, user_id: int, channel_id: Optional[int]):
+        super().__init__(UserSelect(custom_id=f"pvch:kick:{user_id}:{channel_id}", max_values=25, placeholder="追放するユーザーを指定"))
+        self.user_id: int = user_id
+        self.channel_id: Optional[int] = channel_id
 
-    @discord.ui.select(cls=UserSelect, max_values=25, placeholder="追放するユーザーを指定")
-    async def selectMenu(self, ctx: discord.Interaction, select: UserSelect):
-        select.disabled = True
-        await ctx.response.edit_message(view=self)
-        await self.pvch.kick_user(select.values)
+    @classmethod
+    async def from_custom_id(cls, ctx: discord.Interaction, item: UserSelect, match: re.Match[str]) -> KickUserSelectItem:
+        return cls(int(match["user_id"]), int(match["channel_id"]) if match["channel_id"] else None)
 
+    async def callback(self, ctx: discord.Interaction):
+        with metrics.timer("pvch_view_seconds", view="KickUserSelect"):
+            await disable_prompt(ctx, self.view)
+            if (pvch := await resolve_pvch(ctx, self.user_id, self.channel_id)) is None:
+                return
+            await pvch.kick_user(self.item.values)
 
-class DeletePrivateChannel(View):
+
+class DeleteButton(DynamicItem[Button], template=r"pvch:(?P<action>delete|admin_delete):(?P<user_id>[0-9]+)(?::(?P<channel_id>[0-9]+))?"):
     """Channel deletion confirmation button"""
-    def __init__(self, pvch: 'private_channel.PrivateChannel', admin: bool = False):
-        super().__init__()
-        self.pvch: 'private_channel.PrivateChannel' = pvch
+    def __init__(self, user_id: int, channel_id: Optional[int], admin: bool = False):
+        super().__init__(Button(label="はい", style=discord.ButtonStyle.red,
+                                custom_id=f"pvch:{'admin_delete' if admin else 'delete'}:{user_id}:{channel_id}"))
+        self.user_id: int = user_id
+        self.channel_id: Optional[int] = channel_id
         self.admin: bool = admin
 
-    @discord.ui.button(label="はい", style=discord.ButtonStyle.red)
-    async def ok(self, ctx: discord.Interaction, button: Button):
-        button.disabled = True
-        self.cancel_.disabled = True
-        await ctx.response.edit_message(view=self)
-        if self.admin:
-            await self.pvch.force_delete()  # Deletion by Authorized Person
-        else:
-            await self.pvch.delete_channel(ctx)
-
-    @discord.ui.button(label="キャンセル", style=discord.ButtonStyle.gray)
-    async def cancel_(self, ctx: discord.Interaction, button: Button):
-        button.disabled = True
-        self.ok.disabled = True
-        await ctx.response.edit_message(view=self)
-        await ctx.followup.send(embed=info_embed_template("削除をキャンセルしました。"), ephemeral=True)
+    @classmethod
+    async def from_custom_id(cls, ctx: discord.Interaction, item: Button, match: re.Match[str]) -> DeleteButton:
+        return cls(int(match["user_id"]), int(match["channel_id"]) if match["channel_id"] else None, match["action"] == "admin_delete")
+
+    async def callback(self, ctx: discord.Interaction):
+        with metrics.timer("pvch_view_seconds", view="DeletePrivateChannel.ok"):
+            await disable_prompt(ctx, self.view)
+            if (pvch := await resolve_pvch(ctx, self.user_id, self.channel_id)) is None:
+                return
+            if self.admin:
+                await pvch.force_delete()  # Deletion by Authorized Person
+            else:
+                await pvch.delete_channel(ctx)
+
+
+class CancelButton(DynamicItem[Button], template=r"pvch:cancel:(?P<user_id>[0-9]+)"):
+    """Channel deletion cancel button"""
+    def __init__(self, user_id: int):
+        super().__init__(Button(label="キャンセル", style=discord.ButtonStyle.gray, custom_id=f"pvch:cancel:{user_id}"))
+        self.user_id: int = user_id
+
+    @classmethod
+    async def from_custom_id(cls, ctx: discord.Interaction, item: Button, match: re.Match[str]) -> CancelButton:
+        return cls(int(match["user_id"]))
+
+    async def callback(self, ctx: discord.Interaction):
+        with metrics.timer("pvch_view_seconds", view="DeletePrivateChannel.cancel"):
+            await disable_prompt(ctx, self.view)
+            await ctx.followup.send(embed=info_embed_template("削除をキャンセルしました。"), ephemeral=True)
+
+
+# Registered once with bot.add_dynamic_items(), they are resolved from the custom_id on every click, even after a restart
+DYNAMIC_ITEMS: tuple[type[DynamicItem], ...] = (InviteUserSelectItem, KickUserSelectItem, DeleteButton, CancelButton)
+
+
+class InviteUserSelect(View):
+    """User invitation prompt"""
+    def __init__(self, pvch: 'private_channel.PrivateChannel'):
+        super().__init__(timeout=None)
+        self.add_item(InviteUserSelectItem(pvch.user_id, pvch.txt_channel.id))
+
+
+class KickUserSelect(View):
+    """User kick prompt"""
+    def __init__(self, pvch: 'private_channel.PrivateChannel'):
+        super().__init__(timeout=None)
+        self.add_item(KickUserSelectItem(pvch.user_id, pvch.txt_channel.id))
+
+
+class DeletePrivateChannel(View):
+    """Channel deletion confirmation prompt"""
+    def __init__(self, pvch: 'private_channel.PrivateChannel', admin: bool = False):
+        super().__init__(timeout=None)
+        self.add_item(DeleteButton(pvch.user_id, pvch.txt_channel.id, admin))
+        self.add_item(CancelButton(pvch.user_id))
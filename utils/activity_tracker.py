@@ -0,0 +1,81 @@
+from __future__ import annotations
+import discord
+
+from datetime import datetime
+from typing import Optional
+
+from Cogs import private_channel
+from utils.rw_pvch_data import PvchDataCsv
+
+from settings import PVCH_ACTIVITY_PERSIST_INTERVAL
+
+
+class ActivityTracker:
+    """In-memory last activity times of private channels, fed by gateway events"""
+    def __init__(self, pvch_data_csv: PvchDataCsv):
+        self.pvch_data_csv: PvchDataCsv = pvch_data_csv
+        self._last_active: dict[int, float] = {}  # {user_id: last active timestamp}
+        self._persisted: dict[int, float] = {}  # {user_id: last persisted timestamp}
+
+    def load(self):
+        """Seed activity times persisted by the store"""
+        self._last_active.clear()
+        self._persisted.clear()
+        for record in self.pvch_data_csv.records():
+            # A record that never saw activity (e.g. legacy CSV rows) falls back to a history lookup
+            if record.last_active_at > record.created_at:
+                self._last_active[record.user_id] = record.last_active_at
+                self._persisted[record.user_id] = record.last_active_at
+
+    def touch(self, user_id: int, timestamp: Optional[float] = None):
+        """Record activity in a private channel"""
+        if timestamp is None:
+            timestamp = datetime.now().timestamp()
+        if timestamp <= self._last_active.get(user_id, 0.0):
+            return
+        self._last_active[user_id] = timestamp
+        if timestamp - self._persisted.get(user_id, 0.0) >= PVCH_ACTIVITY_PERSIST_INTERVAL:
+            self._persist(user_id)
+
+    def forget(self, user_id: int):
+        self._last_active.pop(user_id, None)
+        self._persisted.pop(user_id, None)
+
+    def get(self, user_id: int) -> Optional[float]:
+        """Return the known last activity time without any API call"""
+        return self._last_active.get(user_id)
+
+    async def last_active(self, pvch: 'private_channel.PrivateChannel') -> float:
+        """Return the last activity time, looking up the history only the first time after a cold start"""
+        if len(pvch.vc_channel.voice_states) > 0:  # Someone is in the voice channel right now
+            self.touch(pvch.user_id)
+        if (timestamp := self._last_active.get(pvch.user_id)) is not None:
+            return timestamp
+
+        timestamp = pvch.txt_channel.created_at.timestamp()
+        last_msg: list[discord.Message] = [message async for message in pvch.txt_channel.history(limit=1)]
+        if len(last_msg) > 0:
+            timestamp = last_msg[0].created_at.timestamp()
+        self._last_active[pvch.user_id] = timestamp
+        self._persist(pvch.user_id)
+        return timestamp
+
+    def export(self) -> tuple[dict[int, float], dict[int, float]]:
+        """Activity times and their persisted values, handed to the tracker of a reloaded cog"""
+        return dict(self._last_active), dict(self._persisted)
+
+    def restore(self, last_active: dict[int, float], persisted: dict[int, float]):
+        """Take over the state of `export()` instead of seeding it from the store"""
+        self._last_active = dict(last_active)
+        self._persisted = dict(persisted)
+
+    def flush(self):
+        """Persist every activity time that has not been persisted yet"""
+        for user_id, timestamp in self._last_active.items():
+            if self._persisted.get(user_id) != timestamp:
+                self._persist(user_id)
+
+    def _persist(self, user_id: int):
+        timestamp: float = self._last_active[user_id]
+        self.pvch_data_csv.touch(user_id, timestamp)
+        self._persisted[user_id] = timestamp
@@ -0,0 +1,178 @@
+import discord
+from discord import CategoryChannel, Guild
+
+import asyncio
+import json
+import os
+import time
+from loguru import logger
+from typing import Callable, Optional
+
+from utils.rest_queue import Priority, rest_queue
+
+from settings import PVCH_CATEGORY_CAPACITY, PVCH_OVERFLOW_CATEGORIES_PATH
+
+
+def is_category_full(error: BaseException) -> bool:
+    """Whether a channel creation failed because Discord counts the category as full"""
+    return isinstance(error, discord.HTTPException) and error.code == 50035 and "parent_id" in error.text
+
+
+class CategoryAllocator:
+    """Spread private channels over the base category and automatically created overflow categories
+
+    Overflow categories are named `<base category name>-<n>` and copy the base category's overwrites.
+    Only the categories whose ids the bot recorded in `path` when creating them are managed (and deleted once empty),
+    so a category an admin named the same way is left alone.
+    Created channels only reach `category.channels` with their gateway event, until then they are counted separately.
+    """
+    CACHE_TIMEOUT: float = 30.0  # Seconds after which a created channel missing from the cache (e.g. lost in a reconnect) is no longer counted
+    def __init__(self, capacity: int = PVCH_CATEGORY_CAPACITY, path: str = PVCH_OVERFLOW_CATEGORIES_PATH):
+        self.capacity: int = capacity
+        self.path: str = path
+        self.base: Optional[CategoryChannel] = None
+        self._categories: dict[int, CategoryChannel] = {}  # {category_id: CategoryChannel}
+        self._pending: dict[int, int] = {}  # {category_id: slots reserved by in-flight creations}
+        self._uncached: dict[int, dict[int, float]] = {}  # {category_id: {channel_id: created at}} of created channels not cached yet
+        self._full: dict[int, float] = {}  # {category_id: until} of categories Discord refused a channel in
+        self._lock: asyncio.Lock = None
+
+    def load(self, base: CategoryChannel):
+        """Manage the base category and the overflow categories created earlier"""
+        self.base = base
+        self._lock = asyncio.Lock()
+        self._categories = {base.id: base}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                category_ids: list[int] = json.load(f)
+        except FileNotFoundError:  # Nothing created yet, a category merely named like an overflow category is not ours
+            category_ids: list[int] = []
+        for category_id in category_ids:
+            if isinstance(category := base.guild.get_channel(category_id), CategoryChannel):
+                self._categories[category_id] = category
+        if len(self._categories) - 1 != len(category_ids):  # Drop the ids of deleted categories
+            self._save()
+
+    def rebind(self, guild: Guild):
+        """Replace the held categories with the guild's cached ones, e.g. after a reconnect rebuilt the cache"""
+        if isinstance(base := guild.get_channel(self.base.id), CategoryChannel):
+            self.base = base
+        for category_id in list(self._categories):
+            if isinstance(category := guild.get_channel(category_id), CategoryChannel):
+                self._categories[category_id] = category
+            elif category_id != self.base.id:
+                self.forget(category_id)
+        self._categories[self.base.id] = self.base
+
+    def is_managed(self, category_id: Optional[int]) -> bool:
+        return category_id in self._categories
+
+    def categories(self) -> list[CategoryChannel]:
+        return list(self._categories.values())
+
+    async def allocate(self, slots: int = 2) -> CategoryChannel:
+        """Reserve room for `slots` channels, creating an overflow category if every category is full
+
+        Every call must be paired with `release()` once the channels have been created (or failed).
+        """
+        async with self._lock:
+            for category in self._categories.values():
+                if self._used(category) + slots <= self.capacity and self._full.get(category.id, 0) < time.monotonic():
+                    break
+            else:
+                category = await self._create_overflow()
+            self._pending[category.id] = self._pending.get(category.id, 0) + slots
+            return category
+
+    def release(self, category: CategoryChannel, slots: int = 2, created: tuple[discord.abc.GuildChannel, ...] = ()):
+        """Give back the slots reserved by `allocate()`, `created` keep counting until they are cached"""
+        if (pending := self._pending.get(category.id, 0) - slots) > 0:
+            self._pending[category.id] = pending
+        else:
+            self._pending.pop(category.id, None)
+        if len(created) > 0:
+            now: float = time.monotonic()
+            self._uncached.setdefault(category.id, {}).update((channel.id, now) for channel in created)
+
+    async def create_pair(self, name: str, overwrites: Callable[[CategoryChannel], dict],
+                          priority: Priority = Priority.USER) -> list:
+        """Create a text and a voice channel in a category with room for them
+
+        Returns the result of each creation, a channel or the exception. If Discord refuses a category as full
+        although its cached channels say otherwise, the category is skipped for a while and the pair is created in another one.
+        """
+        for attempt in range(2):
+            category: CategoryChannel = await self.allocate()
+            try:
+                results: list = await asyncio.gather(rest_queue.create_text_channel(category, priority, name=name, overwrites=overwrites(category)),
+                                                     rest_queue.create_voice_channel(category, priority, name=name, overwrites=overwrites(category)),
+                                                     return_exceptions=True)
+            except BaseException:
+                self.release(category)
+                raise
+            created: list = [channel for channel in results if not isinstance(channel, BaseException)]
+            if attempt > 0 or not any(is_category_full(result) for result in results):
+                self.release(category, created=tuple(created))
+                return results
+            self.release(category)
+            self._full[category.id] = time.monotonic() + self.CACHE_TIMEOUT
+            logger.warning(f"Category {category.name} is full, retrying in another category.")
+            for channel in created:  # Roll back the created half
+                try:
+                    await rest_queue.delete(channel, priority)
+                except discord.HTTPException:
+                    logger.error(f"Failed to delete channel {channel.id}.")
+
+    def forget(self, category_id: int):
+        """Stop managing a category that was deleted"""
+        if self.base is not None and category_id != self.base.id and self._categories.pop(category_id, None) is not None:
+            self._pending.pop(category_id, None)
+            self._uncached.pop(category_id, None)
+            self._full.pop(category_id, None)
+            self._save()
+
+    async def remove_empty(self):
+        """Delete overflow categories that no longer hold any channel"""
+        async with self._lock:
+            for category in list(self._categories.values()):
+                if category.id == self.base.id or self._used(category) > 0:
+                    continue
+                try:
+                    await rest_queue.delete(category, Priority.MAINTENANCE)
+                    self.forget(category.id)
+                    logger.info(f"Deleted empty overflow category {category.name}.")
+                except discord.HTTPException:
+                    logger.error(f"Failed to delete overflow category {category.name}.")
+
+    def _used(self, category: CategoryChannel) -> int:
+        """Channels in the category, including reserved slots and created channels not cached yet"""
+        channel_ids: set[int] = {channel.id for channel in category.channels}
+        if (uncached := self._uncached.get(category.id)) is not None:
+            deadline: float = time.monotonic() - self.CACHE_TIMEOUT
+            for channel_id, created_at in list(uncached.items()):
+                if channel_id in channel_ids or created_at < deadline:
+                    del uncached[channel_id]
+            if len(uncached) == 0:
+                del self._uncached[category.id]
+        return len(channel_ids) + len(uncached or ()) + self._pending.get(category.id, 0)
+
+    async def _create_overflow(self) -> CategoryChannel:
+        guild: Guild = self.base.guild
+        used: set[str] = {category.name for category in (*guild.categories, *self._categories.values())}
+        n: int = 1
+        while f"{self.base.name}-{n}" in used:
+            n += 1
+        category: CategoryChannel = await rest_queue.create_category(guild, name=f"{self.base.name}-{n}", overwrites=self.base.overwrites,
+                                                                     position=self.base.position + n)
+        self._categories[category.id] = category
+        self._save()
+        logger.info(f"Created overflow category {category.name}.")
+        return category
+
+    def _save(self):
+        """Record the managed overflow category ids, replacing the file atomically"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path: str = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([category_id for category_id in self._categories if category_id != self.base.id], f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import discord
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from loguru import logger
+from typing import Any, Optional
+
+from Cogs import private_channel
+from utils.metrics import metrics
+
+from settings import PVCH_ARCHIVE_DIR, PVCH_ARCHIVE_CONCURRENCY, PVCH_ARCHIVE_PAGE_SIZE
+
+
+class ArchiveInfo:
+    """Checkpoint of one channel archive, stored next to it as `<archive>.cursor.json`"""
+    __slots__ = ("path", "user_id", "channel_id", "channel_name", "last_message_id", "offset", "messages", "complete", "updated_at")
+
+    def __init__(self, path: str, user_id: int, channel_id: int, channel_name: str, last_message_id: Optional[int] = None,
+                 offset: int = 0, messages: int = 0, complete: bool = False, updated_at: Optional[float] = None):
+        self.path: str = path
+        self.user_id: int = user_id
+        self.channel_id: int = channel_id
+        self.channel_name: str = channel_name
+        self.last_message_id: Optional[int] = last_message_id  # Newest message written up to `offset`
+        self.offset: int = offset  # Archive size at the checkpoint, anything after it is an interrupted write
+        self.messages: int = messages
+        self.complete: bool = complete
+        self.updated_at: float = updated_at if updated_at is not None else time.time()
+
+    def __str__(self) -> str:
+        return f"{os.path.basename(self.path)} ({self.messages} messages, {self.offset} bytes{'' if self.complete else ', partial'})"
+
+    @property
+    def cursor_path(self) -> str:
+        return self.path + ".cursor.json"
+
+    @classmethod
+    def read(cls, path: str) -> Optional[ArchiveInfo]:
+        try:
+            with open(path + ".cursor.json", "r", encoding="utf-8") as f:
+                return cls(path, **json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def write(self):
+        """Replace the checkpoint atomically"""
+        self.updated_at = time.time()
+        tmp_path: str = self.cursor_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({attr: getattr(self, attr) for attr in self.__slots__ if attr != "path"}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.cursor_path)
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GiB"
+
+def serialize_message(message: discord.Message) -> dict[str, Any]:
+    return {"id": message.id, "created_at": message.created_at.isoformat(),
+            "edited_at": message.edited_at.isoformat() if message.edited_at is not None else None,
+            "author_id": message.author.id, "author": str(message.author), "content": message.content,
+            "attachments": [attachment.url for attachment in message.attachments], "embeds": [embed.to_dict() for embed in message.embeds],
+            "reference": message.reference.message_id if message.reference is not None else None}
+
+
+class ChannelArchiver:
+    """Stream text channel histories into gzip-compressed JSON Lines files
+
+    Messages are fetched oldest first and written a page at a time, each page as its own gzip member followed by a
+    checkpoint, so memory is bounded by one page whatever the history length. An interrupted archive is truncated to
+    its last checkpoint and continues after the last archived message.
+    """
+    def __init__(self, directory: str = PVCH_ARCHIVE_DIR, concurrency: int = PVCH_ARCHIVE_CONCURRENCY, page_size: int = PVCH_ARCHIVE_PAGE_SIZE):
+        self.directory: str = directory
+        self.concurrency: int = concurrency
+        self.page_size: int = page_size
+        self._semaphore: Optional[asyncio.Semaphore] = None  # Created on first use so it binds to the running loop
+
+    def path(self, guild_id: int, user_id: int, channel_id: int) -> str:
+        return os.path.join(self.directory, str(guild_id), f"pvch-{user_id}-{channel_id}.jsonl.gz")
+
+    async def archive(self, pvch: 'private_channel.PrivateChannel') -> ArchiveInfo:
+        """Archive the private channel's text history, resuming an earlier interrupted run"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            started: float = time.perf_counter()
+            info: ArchiveInfo = await asyncio.to_thread(self._prepare, pvch)
+            resumed_from: Optional[int] = info.last_message_id
+            archived_before: int = info.messages
+            after: Optional[discord.Object] = discord.Object(id=info.last_message_id) if info.last_message_id is not None else None
+            page: list[str] = []
+            last_message_id: Optional[int] = None
+            async for message in pvch.txt_channel.history(limit=None, after=after, oldest_first=True):
+                page.append(json.dumps(serialize_message(message), ensure_ascii=False))
+                last_message_id = message.id
+                if len(page) >= self.page_size:
+                    await asyncio.to_thread(self._append, info, page, last_message_id)
+                    page = []
+            if len(page) > 0:
+                await asyncio.to_thread(self._append, info, page, last_message_id)
+            info.complete = True
+            await asyncio.to_thread(info.write)
+
+            metrics.observe("pvch_archive_seconds", time.perf_counter() - started)
+            metrics.inc("pvch_archive_messages_total", info.messages - archived_before)
+            logger.info(f"Archived {pvch.txt_channel.name}: {info}" + (f", resumed after message {resumed_from}" if resumed_from is not None else ""))
+            return info
+
+    def archives(self, guild_id: int) -> list[ArchiveInfo]:
+        """Archives of a guild, most recently updated first"""
+        directory: str = os.path.join(self.directory, str(guild_id))
+        try:
+            names: list[str] = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        archives: list[ArchiveInfo] = []
+        for name in names:
+            if name.endswith(".jsonl.gz") and (info := ArchiveInfo.read(os.path.join(directory, name))) is not None:
+                archives.append(info)
+        archives.sort(key=lambda info: info.updated_at, reverse=True)
+        return archives
+
+    def _prepare(self, pvch: 'private_channel.PrivateChannel') -> ArchiveInfo:
+        """Load the checkpoint, dropping whatever an interrupted run wrote after it"""
+        path: str = self.path(pvch.txt_channel.guild.id, pvch.user_id, pvch.txt_channel.id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        info: Optional[ArchiveInfo] = ArchiveInfo.read(path)
+        if info is None or not os.path.exists(path):
+            info = ArchiveInfo(path, pvch.user_id, pvch.txt_channel.id, pvch.txt_channel.name)
+        if os.path.exists(path) and os.path.getsize(path) != info.offset:
+            logger.warning(f"Truncating interrupted archive {path} to its last checkpoint ({info.offset} bytes).")
+            os.truncate(path, info.offset)
+        open(path, "ab").close()  # An empty channel still gets an (empty) archive
+        info.complete = False
+        return info
+
+    @staticmethod
+    def _append(info: ArchiveInfo, lines: list[str], last_message_id: int):
+        with open(info.path, "ab") as f:
+            with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                gz.write(("\n".join(lines) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            info.offset = f.tell()
+        info.last_message_id = last_message_id
+        info.messages += len(lines)
+        info.write()
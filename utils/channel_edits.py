@@ -0,0 +1,79 @@
+import discord
+
+import time
+from typing import Optional
+
+
+OverwriteState = frozenset  # {(target_id, allow, deny)}
+
+def overwrite_state(channel: discord.abc.GuildChannel) -> OverwriteState:
+    """Comparable form of a channel's permission overwrites"""
+    return frozenset((target.id, *(permissions.value for permissions in overwrite.pair())) for target, overwrite in channel.overwrites.items())
+
+
+class ChannelEditTracker:
+    """Order the bot's own channel edits against the gateway's channel updates
+
+    discord.py does not update the cached channel when `edit()` returns, the gateway update arrives later,
+    possibly after the next edit of the same channel already completed. A private channel therefore keeps the
+    object returned by the bot's last edit, and a gateway update replaces it only if it is not an echo of an
+    older edit. Gateway updates arrive in the order the changes were made, so an update that arrives while
+    the echo of the bot's last edit is still outstanding was made before that edit and is already part of it.
+    """
+    ECHO_TIMEOUT: float = 30.0  # Seconds after which a missing echo (e.g. lost in a reconnect) is no longer waited for
+
+    def __init__(self):
+        self._in_flight: dict[int, int] = {}  # {channel_id: edits sent and not answered yet}
+        self._seen: dict[int, list[OverwriteState]] = {}  # {channel_id: states of updates that arrived while edits were in flight}
+        self._unconfirmed: dict[int, list[tuple[float, OverwriteState]]] = {}  # {channel_id: [(answered at, state)] without an echo yet}
+
+    def begin(self, channel_id: int):
+        """An edit of the channel is about to be sent"""
+        self._in_flight[channel_id] = self._in_flight.get(channel_id, 0) + 1
+
+    def end(self, channel_id: int, edited: Optional[discord.abc.GuildChannel]):
+        """The edit was answered with `edited` (None if it failed)"""
+        if edited is not None and (state := overwrite_state(edited)) not in self._seen.get(channel_id, ()):  # Its echo may have come first
+            self._unconfirmed.setdefault(channel_id, []).append((time.monotonic(), state))
+        if (in_flight := self._in_flight.get(channel_id, 0) - 1) > 0:
+            self._in_flight[channel_id] = in_flight
+        else:
+            self._in_flight.pop(channel_id, None)
+            self._seen.pop(channel_id, None)
+
+    async def edit(self, channel: discord.abc.GuildChannel, **options) -> Optional[discord.abc.GuildChannel]:
+        """`channel.edit()`, recorded so its echo is recognized"""
+        self.begin(channel.id)
+        edited: Optional[discord.abc.GuildChannel] = None
+        try:
+            edited = await channel.edit(**options)
+            return edited
+        finally:
+            self.end(channel.id, edited)
+
+    def is_current(self, after: discord.abc.GuildChannel) -> bool:
+        """Whether a gateway update is at least as new as the bot's last edit of the channel"""
+        state: OverwriteState = overwrite_state(after)
+        if after.id in self._in_flight:  # The answer of the edit in flight supersedes it
+            self._seen.setdefault(after.id, []).append(state)
+            return False
+        deadline: float = time.monotonic() - self.ECHO_TIMEOUT
+        unconfirmed: list[tuple[float, OverwriteState]] = [entry for entry in self._unconfirmed.pop(after.id, ()) if entry[0] > deadline]
+        for i, (_, expected) in enumerate(unconfirmed):
+            if expected == state:
+                unconfirmed = unconfirmed[i + 1:]  # Echoes of the earlier edits are no longer coming
+                break
+        if len(unconfirmed) > 0:
+            self._unconfirmed[after.id] = unconfirmed
+            return False
+        return True
+
+    def forget(self, channel_id: int):
+        self._in_flight.pop(channel_id, None)
+        self._seen.pop(channel_id, None)
+        self._unconfirmed.pop(channel_id, None)
+
+    def clear(self):
+        """Forget outstanding echoes, e.g. once the cache was rebuilt from scratch after a reconnect"""
+        self._seen.clear()
+        self._unconfirmed.clear()
@@ -0,0 +1,140 @@
+import discord
+from discord import CategoryChannel, TextChannel, VoiceChannel
+
+import asyncio
+import re
+import secrets
+from loguru import logger
+from typing import Optional
+
+from utils.category_allocator import CategoryAllocator
+from utils.pvch_registry import PvchRegistry
+from utils.rest_queue import Priority, rest_queue
+
+from settings import PVCH_POOL_SIZE, PVCH_POOL_REFILL_INTERVAL, PVCH_POOL_CHANNEL_NAME
+
+
+class ChannelPool:
+    """Warm pool of hidden, pre-created text/voice channel pairs, named `<PVCH_POOL_CHANNEL_NAME>-<6 hex digits>`"""
+    NAME_PATTERN: re.Pattern = re.compile(rf"{re.escape(PVCH_POOL_CHANNEL_NAME)}-[0-9a-f]{{6}}")
+
+    def __init__(self, size: int = PVCH_POOL_SIZE, refill_interval: float = PVCH_POOL_REFILL_INTERVAL):
+        self.size: int = size
+        self.refill_interval: float = refill_interval
+        self.allocator: Optional[CategoryAllocator] = None
+        self.hits: int = 0
+        self.misses: int = 0
+        self.created: int = 0
+        self._pairs: list[tuple[TextChannel, VoiceChannel]] = []
+        self._channel_ids: set[int] = set()
+        self._refill: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def is_pool_channel(self, channel_id: int) -> bool:
+        return channel_id in self._channel_ids
+
+    def start(self, allocator: CategoryAllocator, registry: PvchRegistry):
+        """Adopt pool channels left from a previous run and start refilling
+
+        A registered private channel is never adopted, even if its owner's name makes it look like a pool channel.
+        """
+        self.allocator = allocator
+        if not self.enabled:
+            return
+        self._pairs.clear()
+        self._channel_ids.clear()
+        for category in allocator.categories():
+            voice_channels: dict[str, VoiceChannel] = {ch.name: ch for ch in category.voice_channels
+                                                       if self.NAME_PATTERN.fullmatch(ch.name) and registry.get_by_vc(ch.id) is None}
+            for txt_channel in category.text_channels:
+                if registry.get_by_txt(txt_channel.id) is None and (vc_channel := voice_channels.get(txt_channel.name)) is not None:
+                    self._add(txt_channel, vc_channel)
+        if self._task is None or self._task.done():
+            self._refill = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def rebind(self, guild: discord.Guild):
+        """Replace the pooled channels with the guild's cached ones, dropping pairs deleted meanwhile"""
+        pairs: list[tuple[TextChannel, VoiceChannel]] = self._pairs
+        self._pairs = []
+        self._channel_ids.clear()
+        for txt_channel, vc_channel in pairs:
+            txt_channel, vc_channel = guild.get_channel(txt_channel.id), guild.get_channel(vc_channel.id)
+            if isinstance(txt_channel, TextChannel) and isinstance(vc_channel, VoiceChannel):
+                self._add(txt_channel, vc_channel)
+        if len(self._pairs) < len(pairs) and self._refill is not None:
+            self._refill.set()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def acquire(self) -> Optional[tuple[TextChannel, VoiceChannel]]:
+        """Take a pooled channel pair, or None if the pool is empty"""
+        if not self.enabled:
+            return None
+        if self._refill is not None:
+            self._refill.set()
+        if len(self._pairs) == 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        txt_channel, vc_channel = self._pairs.pop(0)
+        self._channel_ids.difference_update((txt_channel.id, vc_channel.id))
+        return txt_channel, vc_channel
+
+    def discard(self, channel_id: int):
+        """Forget a pair whose channel was deleted"""
+        if channel_id not in self._channel_ids:
+            return
+        for pair in self._pairs:
+            if channel_id in (pair[0].id, pair[1].id):
+                self._pairs.remove(pair)
+                self._channel_ids.difference_update((pair[0].id, pair[1].id))
+                break
+        if self._refill is not None:
+            self._refill.set()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._pairs), "target": self.size, "hits": self.hits, "misses": self.misses, "created": self.created}
+
+    def _add(self, txt_channel: TextChannel, vc_channel: VoiceChannel):
+        self._pairs.append((txt_channel, vc_channel))
+        self._channel_ids.update((txt_channel.id, vc_channel.id))
+
+    async def _create_pair(self):
+        name: str = f"{PVCH_POOL_CHANNEL_NAME}-{secrets.token_hex(3)}"
+
+        def overwrites(category: CategoryChannel) -> dict:
+            return {**category.overwrites, category.guild.default_role: discord.PermissionOverwrite(view_channel=False)}
+
+        results: list = await self.allocator.create_pair(name, overwrites, Priority.MAINTENANCE)
+        if any(isinstance(result, BaseException) for result in results):
+            for channel in results:
+                if not isinstance(channel, BaseException):
+                    await rest_queue.delete(channel, Priority.MAINTENANCE)
+            raise next(result for result in results if isinstance(result, BaseException))
+        self.created += 1
+        self._add(results[0], results[1])
+
+    async def _run(self):
+        while True:
+            if len(self._pairs) >= self.size:
+                self._refill.clear()
+                await self._refill.wait()
+                continue
+            try:
+                await self._create_pair()
+                if len(self._pairs) >= self.size:
+                    logger.info(f"Private channel pool is full: {self.stats()}")
+            except discord.HTTPException:
+                logger.error("Failed to create pooled private channel.")
+            await asyncio.sleep(self.refill_interval)
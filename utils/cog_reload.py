@@ -0,0 +1,37 @@
+"""In-place reload of the private channel extension together with the settings and the modules it imports"""
+import sys
+import time
+from discord.ext import commands
+from types import ModuleType
+
+EXTENSION: str = "Cogs.private_channel"
+
+
+def is_reloaded_module(name: str) -> bool:
+    """settings.py and the utils/ui modules are imported again by the reloaded extension"""
+    return name == "settings" or name.startswith(("utils.", "ui."))
+
+async def reload_extension(bot: commands.Bot, name: str = EXTENSION) -> float:
+    """Reload the extension with fresh settings and helper modules, returns the seconds it took
+
+    The gateway connection and its caches stay as they are. If the new code fails to import, discord.py
+    sets the old module up again and the previous helper modules are put back.
+    """
+    started: float = time.perf_counter()
+    previous: dict[str, ModuleType] = {module_name: module for module_name, module in sys.modules.items() if is_reloaded_module(module_name)}
+    for module_name in previous:
+        del sys.modules[module_name]
+    # `from Cogs import private_channel` in the helper modules must resolve to the new module, not the package's attribute
+    package, _, attr = name.rpartition(".")
+    if hasattr(sys.modules[package], attr):
+        delattr(sys.modules[package], attr)
+    try:
+        await bot.reload_extension(name)
+    except commands.ExtensionError:
+        for module_name in [module_name for module_name in sys.modules if is_reloaded_module(module_name)]:
+            del sys.modules[module_name]
+        sys.modules.update(previous)
+        raise
+    finally:
+        setattr(sys.modules[package], attr, sys.modules[name])
+    return time.perf_counter() - started
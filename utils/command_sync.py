@@ -0,0 +1,35 @@
+from discord import app_commands
+
+import hashlib
+import json
+import os
+from loguru import logger
+from typing import Optional
+
+from settings import COMMAND_TREE_HASH_PATH
+
+
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    """Hash the signatures of every global command and context menu"""
+    payload: list[dict] = [cmd.to_dict(tree) for cmd in tree.get_commands()]
+    payload.sort(key=lambda cmd: (cmd.get("type", 1), cmd["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def sync_command_tree(tree: app_commands.CommandTree, hash_path: str = COMMAND_TREE_HASH_PATH) -> bool:
+    """Sync the command tree only when its hash differs from the last synced one, returns whether it synced"""
+    digest: str = command_tree_hash(tree)
+    stored: Optional[str] = None
+    try:
+        with open(hash_path, "r") as f:
+            stored = f.read().strip()
+    except FileNotFoundError:
+        pass
+    if stored == digest:
+        return False
+
+    await tree.sync()
+    os.makedirs(os.path.dirname(hash_path) or ".", exist_ok=True)
+    with open(hash_path, "w") as f:
+        f.write(digest)
+    logger.info(f"Synced command tree ({digest[:12]}).")
+    return True
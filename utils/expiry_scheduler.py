@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import time
+from loguru import logger
+from typing import Awaitable, Callable, Optional
+
+
+class ExpiryScheduler:
+    """Min-heap of per-channel expiry deadlines that wakes only when the nearest one is due
+
+    Deadlines that move later are only updated in `_deadlines`; the stale heap entry is
+    re-pushed with the new deadline when it surfaces, so frequent activity does not grow the heap.
+    """
+    MAX_SLEEP: float = 3600.0  # Re-check the clock at least hourly
+    RETRY_DELAY: float = 3600.0  # Delay before retrying a failed deletion
+
+    def __init__(self):
+        self._heap: list[tuple[float, int]] = []  # [(deadline, user_id)]
+        self._deadlines: dict[int, float] = {}  # {user_id: deadline}
+        self._wakeup: Optional[asyncio.Event] = None  # Created in start() so it binds to the running loop
+        self._task: Optional[asyncio.Task] = None
+        self._on_due: Optional[Callable[[list[int]], Awaitable[None]]] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def get(self, user_id: int) -> Optional[float]:
+        return self._deadlines.get(user_id)
+
+    def deadlines(self) -> dict[int, float]:
+        return dict(self._deadlines)
+
+    def schedule(self, user_id: int, deadline: float):
+        """Set or re-key the deadline of a private channel"""
+        prev: Optional[float] = self._deadlines.get(user_id)
+        if prev == deadline:
+            return
+        self._deadlines[user_id] = deadline
+        if prev is None or deadline < prev:
+            heapq.heappush(self._heap, (deadline, user_id))
+            if self._heap[0][1] == user_id and self._wakeup is not None:
+                self._wakeup.set()
+
+    def cancel(self, user_id: int):
+        self._deadlines.pop(user_id, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def start(self, on_due: Callable[[list[int]], Awaitable[None]]):
+        """Start dispatching due owners to `on_due`"""
+        self._on_due = on_due
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _pop_due(self, now: float) -> list[int]:
+        due: list[int] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, user_id = heapq.heappop(self._heap)
+            current: Optional[float] = self._deadlines.get(user_id)
+            if current is None or current < deadline:
+                continue  # Cancelled, or superseded by an earlier entry
+            if current > deadline:
+                heapq.heappush(self._heap, (current, user_id))  # Moved later while queued
+                continue
+            del self._deadlines[user_id]
+            due.append(user_id)
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            due: list[int] = self._pop_due(time.time())
+            if len(due) > 0:
+                try:
+                    await self._on_due(due)
+                except Exception:
+                    logger.exception("Failed to process expired private channels.")
+                continue
+
+            timeout: float = self.MAX_SLEEP
+            if self._heap:
+                timeout = min(max(self._heap[0][0] - time.time(), 0.0), self.MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
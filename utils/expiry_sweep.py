@@ -0,0 +1,55 @@
+import asyncio
+import time
+from loguru import logger
+from typing import Awaitable, Callable
+
+
+class SweepStats:
+    """Result of one expiry sweep"""
+    __slots__ = ("checked", "expired", "failed", "duration")
+
+    def __init__(self):
+        self.checked: int = 0
+        self.expired: int = 0
+        self.failed: int = 0
+        self.duration: float = 0.0
+
+    def __str__(self) -> str:
+        return f"checked={self.checked}, expired={self.expired}, failed={self.failed}, duration={self.duration:.3f}s"
+
+
+async def run_sweep(user_ids: list[int], is_expired: Callable[[int], Awaitable[bool]], delete: Callable[[int], Awaitable[bool]],
+                    check_concurrency: int, delete_concurrency: int) -> tuple[SweepStats, list[int]]:
+    """Check expiry with bounded concurrency, then delete expired channels in bounded parallel batches
+
+    Returns the sweep statistics and the owners that are still alive (not expired, or failed to delete).
+    """
+    stats: SweepStats = SweepStats()
+    start: float = time.perf_counter()
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(check_concurrency)
+
+    async def check(user_id: int) -> bool:
+        async with semaphore:
+            try:
+                return await is_expired(user_id)
+            except Exception:
+                logger.exception(f"Failed to check expiration of private channel (user_id={user_id}).")
+                stats.failed += 1
+                return False
+
+    results: list[bool] = await asyncio.gather(*[check(user_id) for user_id in user_ids])
+    stats.checked = len(user_ids)
+    expired: list[int] = [user_id for user_id, result in zip(user_ids, results) if result]
+    alive: list[int] = [user_id for user_id, result in zip(user_ids, results) if not result]
+    stats.expired = len(expired)
+
+    for i in range(0, len(expired), delete_concurrency):
+        batch: list[int] = expired[i:i + delete_concurrency]
+        deleted: list[bool] = await asyncio.gather(*[delete(user_id) for user_id in batch])
+        for user_id, ok in zip(batch, deleted):
+            if not ok:
+                stats.failed += 1
+                alive.append(user_id)
+
+    stats.duration = time.perf_counter() - start
+    return stats, alive
@@ -0,0 +1,50 @@
+import json
+from typing import Optional
+
+from settings import (GUILDS_CONFIG_PATH, GUILD_NAME, GUILD_ID, CATEGORY_ID, OWNER_ROLE_ID, MODERATOR_ROLE_ID,
+                      INACTIVE_DAYS, INACTIVE_SB_DAYS)
+
+
+class GuildConfig:
+    """Settings of one guild served by the bot"""
+    __slots__ = ("guild_id", "category_id", "owner_role_id", "moderator_role_id", "inactive_days", "inactive_sb_days", "guild_name")
+
+    def __init__(self, guild_id: int, category_id: int, owner_role_id: int = 0, moderator_role_id: int = 0,
+                 inactive_days: int = INACTIVE_DAYS, inactive_sb_days: int = INACTIVE_SB_DAYS, guild_name: Optional[str] = None):
+        self.guild_id: int = guild_id
+        self.category_id: int = category_id  # Private Channel Category ID
+        self.owner_role_id: int = owner_role_id
+        self.moderator_role_id: int = moderator_role_id
+        self.inactive_days: int = inactive_days
+        self.inactive_sb_days: int = inactive_sb_days
+        self.guild_name: Optional[str] = guild_name  # Name shown in the welcome message, the guild's own name if None
+
+    @property
+    def staff_role_ids(self) -> tuple[int, int]:
+        """Top roles that are never invited, kicked or listed as participants"""
+        return self.owner_role_id, self.moderator_role_id
+
+    def __repr__(self) -> str:
+        return f"GuildConfig(guild_id={self.guild_id}, category_id={self.category_id})"
+
+
+def load_guild_configs(path: str = GUILDS_CONFIG_PATH) -> dict[int, GuildConfig]:
+    """Read the per-guild settings
+
+    The file holds a JSON list of objects with the GuildConfig fields, only `guild_id` and `category_id` are required.
+    Without the file, the single guild of settings.py is served.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries: list[dict] = json.load(f)
+    except FileNotFoundError:
+        return {GUILD_ID: GuildConfig(GUILD_ID, CATEGORY_ID, OWNER_ROLE_ID, MODERATOR_ROLE_ID, INACTIVE_DAYS, INACTIVE_SB_DAYS, GUILD_NAME)}
+
+    configs: dict[int, GuildConfig] = {}
+    for entry in entries:
+        unknown: set[str] = entry.keys() - set(GuildConfig.__slots__)
+        if unknown or "guild_id" not in entry or "category_id" not in entry:
+            raise ValueError(f"Invalid guild config entry in {path}: {entry}")
+        config: GuildConfig = GuildConfig(**entry)
+        configs[config.guild_id] = config
+    return configs
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import discord
+from discord import CategoryChannel, Guild, TextChannel, VoiceChannel
+
+from datetime import timedelta
+from typing import Any, Optional
+
+from Cogs import private_channel
+from utils.guild_config import GuildConfig
+from utils.rw_pvch_data import PvchDataCsv
+from utils.pvch_registry import PvchRegistry
+from utils.pvch_store import PvchRecord, PvchStore, open_store, partition_path
+from utils.activity_tracker import ActivityTracker
+from utils.expiry_scheduler import ExpiryScheduler
+from utils.expiry_sweep import SweepStats
+from utils.channel_pool import ChannelPool
+from utils.category_allocator import CategoryAllocator
+from utils.member_cache import MemberCache
+from utils.channel_edits import ChannelEditTracker
+
+from settings import PVCH_OVERFLOW_CATEGORIES_PATH
+
+
+class GuildPartition:
+    """Private channel state of one guild
+
+    Owners are keyed by user id inside a partition, so the same user can own a private channel in every guild.
+    """
+    def __init__(self, config: GuildConfig, store: Optional[PvchStore] = None):
+        self.config: GuildConfig = config
+        self.guild: Optional[Guild] = None
+        self.category: Optional[CategoryChannel] = None
+        self.pvch_data_csv: PvchDataCsv = PvchDataCsv(store if store is not None else open_store(guild_id=config.guild_id))
+        self.registry: PvchRegistry = PvchRegistry()
+        self.activity_tracker: ActivityTracker = ActivityTracker(self.pvch_data_csv)
+        self.expiry_scheduler: ExpiryScheduler = ExpiryScheduler()
+        self.category_allocator: CategoryAllocator = CategoryAllocator(path=partition_path(PVCH_OVERFLOW_CATEGORIES_PATH, config.guild_id))
+        self.channel_pool: ChannelPool = ChannelPool()
+        self.member_cache: MemberCache = MemberCache()
+        self.channel_edits: ChannelEditTracker = ChannelEditTracker()
+        self.last_sweep: Optional[SweepStats] = None
+
+    def __repr__(self) -> str:
+        return f"GuildPartition(guild_id={self.config.guild_id}, private_channels={len(self.registry)})"
+
+    @property
+    def guild_id(self) -> int:
+        return self.config.guild_id
+
+    @property
+    def guild_name(self) -> str:
+        if self.config.guild_name is not None or self.guild is None:
+            return self.config.guild_name or ""
+        return self.guild.name
+
+    def attach(self, guild: Guild) -> bool:
+        """Bind (or re-bind after a reconnect) the cached guild objects, returns False if the category is missing"""
+        self.guild = guild
+        self.category = guild.get_channel(self.config.category_id)
+        return isinstance(self.category, CategoryChannel)
+
+    def refresh(self, guild: Guild) -> bool:
+        """Re-bind every held channel by id after a reconnect rebuilt the guild cache, without any API call
+
+        Private channels deleted while disconnected are unregistered, as no deletion event reports them.
+        Returns False if the category is missing.
+        """
+        if not self.attach(guild):
+            return False
+        self.category_allocator.rebind(guild)
+        self.channel_pool.rebind(guild)
+        self.channel_edits.clear()  # Echoes of edits made before the reconnect are not coming anymore
+        for pvch in list(self.registry.values()):
+            txt_channel: Optional[discord.abc.GuildChannel] = guild.get_channel(pvch.txt_channel.id)
+            vc_channel: Optional[discord.abc.GuildChannel] = guild.get_channel(pvch.vc_channel.id)
+            if isinstance(txt_channel, TextChannel) and isinstance(vc_channel, VoiceChannel):
+                pvch.txt_channel = txt_channel
+                pvch.vc_channel = vc_channel
+            else:
+                self.unregister(pvch.user_id, pvch)
+        return True
+
+    def load(self):
+        """Read the persisted private channels of the guild"""
+        self.category_allocator.load(self.category)
+        self.registry.load(self.pvch_data_csv.read(self.category_allocator.categories()))
+        self.activity_tracker.load()
+
+    def export_state(self) -> dict[str, Any]:
+        """Plain-data snapshot handed to the partition of a reloaded cog, whose classes may differ from these"""
+        last_active, persisted = self.activity_tracker.export()
+        return {"store": self.pvch_data_csv.store,  # Handed over as is, along with its queued writes
+                "records": [(record.user_id, record.txt_channel_id, record.vc_channel_id, record.created_at, record.last_active_at,
+                             record.booster, tuple(record.guests)) for record in self.pvch_data_csv.records()],
+                "registry": [(pvch.user_id, pvch.txt_channel.id, pvch.vc_channel.id, tuple(pvch.guests)) for pvch in self.registry.values()],
+                "last_active": last_active, "persisted": persisted, "deadlines": self.expiry_scheduler.deadlines(),
+                "inactive_days": (self.config.inactive_days, self.config.inactive_sb_days), "last_sweep": self.last_sweep}
+
+    def restore(self, state: dict[str, Any], copy_records: bool = False):
+        """Take over the state of `export_state()` instead of reading the store
+
+        Channels are resolved from the guild cache, so no API call is made. With `copy_records`, the records
+        are written to this partition's store, which then replaces the one of the previous cog.
+        """
+        self.category_allocator.load(self.category)
+        records: list[PvchRecord] = [PvchRecord(*record[:6], guests=record[6]) for record in state["records"]]
+        self.pvch_data_csv.adopt(records, self.category_allocator.categories())
+        if copy_records:
+            for record in records:
+                self.pvch_data_csv.store.put(record)
+            self.pvch_data_csv.store.sync()
+
+        pvch_data: dict[int, private_channel.PrivateChannel] = {}
+        for user_id, txt_channel_id, vc_channel_id, guests in state["registry"]:
+            txt_channel: Optional[discord.abc.GuildChannel] = self.guild.get_channel(txt_channel_id)
+            vc_channel: Optional[discord.abc.GuildChannel] = self.guild.get_channel(vc_channel_id)
+            if isinstance(txt_channel, TextChannel) and isinstance(vc_channel, VoiceChannel):
+                pvch_data[user_id] = private_channel.PrivateChannel(user_id, txt_channel, vc_channel, set(guests))
+        self.registry.load(pvch_data)
+        if len(pvch_data) < len(state["registry"]):  # Deleted while no cog was listening
+            self.pvch_data_csv.update(self.registry)
+        self.activity_tracker.restore(state["last_active"], state["persisted"])
+        self.last_sweep = state["last_sweep"]
+
+        if state["inactive_days"] == (self.config.inactive_days, self.config.inactive_sb_days):
+            for user_id, deadline in state["deadlines"].items():
+                if user_id in self.registry:
+                    self.expiry_scheduler.schedule(user_id, deadline)
+            for user_id in self.registry:
+                if self.expiry_scheduler.get(user_id) is None:  # Was being checked when the old cog stopped
+                    self.schedule_expiry(user_id)
+        else:  # Inactivity limits changed with the reload
+            for user_id in self.registry:
+                self.schedule_expiry(user_id)
+
+    def unregister(self, user_id: int, pvch: Optional['private_channel.PrivateChannel'] = None):
+        """Drop a private channel from the registry, the activity tracker, the expiry schedule and the store
+
+        When `pvch` is given, nothing happens unless it is still the owner's registered channel,
+        so a deletion that finishes late does not unregister a channel created meanwhile.
+        """
+        if pvch is not None and self.registry.get(user_id) is not pvch:
+            return
+        if (removed := self.registry.remove(user_id)) is not None:
+            self.channel_edits.forget(removed.txt_channel.id)
+            self.channel_edits.forget(removed.vc_channel.id)
+        self.activity_tracker.forget(user_id)
+        self.expiry_scheduler.cancel(user_id)
+        self.pvch_data_csv.delete(user_id)
+
+    def in_pvch_category(self, channel: discord.abc.GuildChannel) -> bool:
+        """Whether the channel belongs to one of the private channel categories"""
+        return self.category_allocator.is_managed(getattr(channel, "category_id", None))
+
+    def is_staff(self, member: discord.abc.User) -> bool:
+        top_role: Optional[discord.Role] = getattr(member, "top_role", None)
+        return top_role is not None and top_role.id in self.config.staff_role_ids
+
+    def inactive_days(self, booster: bool) -> int:
+        return self.config.inactive_sb_days if booster else self.config.inactive_days
+
+    def inactive_days_of(self, user_id: int) -> int:
+        """Allowed inactive days of the owner's private channel"""
+        member: Optional[discord.Member] = self.guild.get_member(user_id) if self.guild is not None else None
+        if member is not None:
+            booster: bool = member.premium_since is not None
+        else:  # Not cached (low memory mode), use the status seen by the last sweep
+            booster: bool = (record := self.pvch_data_csv.get(user_id)) is not None and record.booster
+        return self.inactive_days(booster)
+
+    def schedule_expiry(self, user_id: int):
+        """(Re)compute the expiry deadline of the owner's private channel"""
+        pvch: Optional['private_channel.PrivateChannel'] = self.registry.get(user_id)
+        if pvch is None:
+            return
+        last_active: Optional[float] = self.activity_tracker.get(user_id)
+        if last_active is None:  # Unknown until the first check after a cold start
+            last_active = pvch.txt_channel.created_at.timestamp()
+        self.expiry_scheduler.schedule(user_id, last_active + timedelta(days=self.inactive_days_of(user_id)).total_seconds())
+
+    def stop(self):
+        """Stop the background work of the partition, the store stays open"""
+        self.expiry_scheduler.stop()
+        self.channel_pool.stop()
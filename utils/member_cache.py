@@ -0,0 +1,39 @@
+import discord
+from discord import Guild
+
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from settings import MEMBER_CACHE_TTL, MEMBER_CACHE_SIZE
+
+
+class MemberCache:
+    """Small TTL/LRU cache of members fetched on demand when the gateway member cache is restricted"""
+    def __init__(self, ttl: float = MEMBER_CACHE_TTL, size: int = MEMBER_CACHE_SIZE):
+        self.ttl: float = ttl
+        self.size: int = size
+        self._members: OrderedDict[int, tuple[float, Optional[discord.Member]]] = OrderedDict()  # {user_id: (fetched_at, Member)}
+
+    async def get(self, guild: Guild, user_id: int) -> Optional[discord.Member]:
+        """Return the member from the gateway cache, this cache, or the API (None if not in the guild)"""
+        if (member := guild.get_member(user_id)) is not None:
+            return member
+
+        now: float = time.monotonic()
+        if (entry := self._members.get(user_id)) is not None and now - entry[0] < self.ttl:
+            self._members.move_to_end(user_id)
+            return entry[1]
+
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            member = None
+        self._members[user_id] = (now, member)
+        self._members.move_to_end(user_id)
+        while len(self._members) > self.size:
+            self._members.popitem(last=False)
+        return member
+
+    def invalidate(self, user_id: int):
+        self._members.pop(user_id, None)
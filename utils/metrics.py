@@ -0,0 +1,151 @@
+from aiohttp import web
+
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from loguru import logger
+from typing import Callable, Iterator, Optional
+
+from settings import METRICS_ENABLED, METRICS_HTTP_HOST, METRICS_HTTP_PORT
+
+Labels = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one label set"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets: tuple[float, ...] = buckets
+        self.counts: list[int] = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        rank: float = q * self.count
+        seen: int = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return 0.0
+
+
+class Metrics:
+    """In-process metrics registry rendered in the Prometheus text format
+
+    Every recording method returns immediately when METRICS_ENABLED is off.
+    """
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled: bool = enabled
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.help: dict[str, str] = {}
+        self._lag_task: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        if not self.enabled:
+            return
+        series: dict[Labels, float] = self.counters.setdefault(name, {})
+        key: Labels = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        if not self.enabled:
+            return
+        series: dict[Labels, Histogram] = self.histograms.setdefault(name, {})
+        key: Labels = tuple(sorted(labels.items()))
+        if (histogram := series.get(key)) is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def gauge(self, name: str, func: Callable[[], float], help: str = ""):
+        """Register a gauge evaluated at scrape time"""
+        self.gauges[name] = func
+        if help:
+            self.help[name] = help
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block"""
+        if not self.enabled:
+            yield
+            return
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for name, series in self.counters.items():
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{self._labels(labels)} {value}")
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative: int = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        for name, func in self.gauges.items():
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {func()}")
+        return "\n".join(lines) + "\n"
+
+    async def start(self):
+        """Start the event loop lag probe and the HTTP endpoint"""
+        if not self.enabled:
+            return
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._probe_loop_lag())
+        if METRICS_HTTP_PORT > 0 and self._runner is None:
+            app: web.Application = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, METRICS_HTTP_HOST, METRICS_HTTP_PORT).start()
+            logger.info(f"Serving metrics on http://{METRICS_HTTP_HOST}:{METRICS_HTTP_PORT}/metrics")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def _probe_loop_lag(self, interval: float = 1.0):
+        while True:
+            start: float = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.observe("pvch_event_loop_lag_seconds", max(time.perf_counter() - start - interval, 0.0))
+
+    @staticmethod
+    def _labels(labels: Labels) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics: Metrics = Metrics()
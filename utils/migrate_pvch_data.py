@@ -0,0 +1,34 @@
+"""One-shot migration of the CSV snapshot/journal into the SQLite backend
+
+Usage: python -m utils.migrate_pvch_data
+"""
+from loguru import logger
+
+from utils.guild_config import load_guild_configs
+from utils.pvch_store import PvchRecord, CsvJournalStore, SqliteStore, partition_path
+
+from settings import PVCH_DATA_FILE_PATH, PVCH_JOURNAL_FILE_PATH, PVCH_SQLITE_PATH
+
+
+def migrate(guild_id: int, csv_path: str = PVCH_DATA_FILE_PATH, journal_path: str = PVCH_JOURNAL_FILE_PATH, sqlite_path: str = PVCH_SQLITE_PATH) -> int:
+    """Copy every CSV record of a guild into its SQLite partition, returns the number of migrated records"""
+    src: CsvJournalStore = CsvJournalStore(partition_path(csv_path, guild_id), partition_path(journal_path, guild_id))
+    dst: SqliteStore = SqliteStore(sqlite_path, guild_id)
+    try:
+        records: dict[int, PvchRecord] = src.load()
+        for record in records.values():
+            dst.put(record)
+        dst.compact()
+    finally:
+        src.close()
+        dst.close()
+    return len(records)
+
+def main():
+    for guild_id in load_guild_configs():
+        count: int = migrate(guild_id)
+        logger.info(f"Migrated {count} private channel records of guild {guild_id} to {PVCH_SQLITE_PATH}.")
+    logger.info('Set PVCH_STORAGE_BACKEND = "sqlite" in settings.py to use it.')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from typing import Iterator, Optional
+
+from Cogs import private_channel
+
+
+class PvchRegistry:
+    """In-memory private channel registry indexed by owner, channel and guest"""
+    __slots__ = ("_by_owner", "_by_txt", "_by_vc", "_by_guest")
+
+    def __init__(self):
+        self._by_owner: dict[int, 'private_channel.PrivateChannel'] = {}  # {user_id: PrivateChannel}
+        self._by_txt: dict[int, 'private_channel.PrivateChannel'] = {}  # {txt_channel_id: PrivateChannel}
+        self._by_vc: dict[int, 'private_channel.PrivateChannel'] = {}  # {vc_channel_id: PrivateChannel}
+        self._by_guest: dict[int, set[int]] = {}  # {guest_id: {user_id}}
+
+    def __len__(self) -> int:
+        return len(self._by_owner)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._by_owner
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._by_owner)
+
+    def keys(self):
+        return self._by_owner.keys()
+
+    def values(self):
+        return self._by_owner.values()
+
+    def items(self):
+        return self._by_owner.items()
+
+    def get(self, user_id: int) -> Optional['private_channel.PrivateChannel']:
+        """Look up a private channel by its owner"""
+        return self._by_owner.get(user_id)
+
+    def get_by_txt(self, channel_id: int) -> Optional['private_channel.PrivateChannel']:
+        """Look up a private channel by its text channel id"""
+        return self._by_txt.get(channel_id)
+
+    def get_by_vc(self, channel_id: int) -> Optional['private_channel.PrivateChannel']:
+        """Look up a private channel by its voice channel id"""
+        return self._by_vc.get(channel_id)
+
+    def get_by_channel(self, channel_id: int) -> Optional['private_channel.PrivateChannel']:
+        """Look up a private channel by either its text or voice channel id"""
+        return self._by_txt.get(channel_id) or self._by_vc.get(channel_id)
+
+    def get_by_guest(self, guest_id: int) -> list['private_channel.PrivateChannel']:
+        """List private channels the member has been invited to"""
+        return [self._by_owner[user_id] for user_id in self._by_guest.get(guest_id, ())]
+
+    def add(self, pvch: 'private_channel.PrivateChannel'):
+        """Register a private channel (replaces any previous one of the same owner)"""
+        self.remove(pvch.user_id)
+        self._by_owner[pvch.user_id] = pvch
+        self._by_txt[pvch.txt_channel.id] = pvch
+        self._by_vc[pvch.vc_channel.id] = pvch
+        for guest_id in pvch.guests:
+            self._by_guest.setdefault(guest_id, set()).add(pvch.user_id)
+
+    def remove(self, user_id: int) -> Optional['private_channel.PrivateChannel']:
+        """Unregister a private channel, returns it if it was registered"""
+        pvch: Optional['private_channel.PrivateChannel'] = self._by_owner.pop(user_id, None)
+        if pvch is None:
+            return None
+        self._by_txt.pop(pvch.txt_channel.id, None)
+        self._by_vc.pop(pvch.vc_channel.id, None)
+        for guest_id in pvch.guests:
+            self._discard_guest_index(guest_id, user_id)
+        return pvch
+
+    def load(self, pvch_data: dict[int, 'private_channel.PrivateChannel']):
+        """Replace the registry contents"""
+        self.clear()
+        for pvch in pvch_data.values():
+            self.add(pvch)
+
+    def clear(self):
+        self._by_owner.clear()
+        self._by_txt.clear()
+        self._by_vc.clear()
+        self._by_guest.clear()
+
+    def add_guest(self, pvch: 'private_channel.PrivateChannel', guest_id: int):
+        """Record that a member has been invited to the private channel"""
+        pvch.guests.add(guest_id)
+        if self._by_owner.get(pvch.user_id) is pvch:
+            self._by_guest.setdefault(guest_id, set()).add(pvch.user_id)
+
+    def remove_guest(self, pvch: 'private_channel.PrivateChannel', guest_id: int):
+        """Record that a member has left or been kicked from the private channel"""
+        pvch.guests.discard(guest_id)
+        if self._by_owner.get(pvch.user_id) is pvch:
+            self._discard_guest_index(guest_id, pvch.user_id)
+
+    def sync_guests(self, pvch: 'private_channel.PrivateChannel') -> bool:
+        """Re-derive the guests from the channel overwrites, returns whether they changed"""
+        guests: set[int] = pvch.guests_from_overwrites()
+        if guests == pvch.guests:
+            return False
+        for guest_id in pvch.guests - guests:
+            self.remove_guest(pvch, guest_id)
+        for guest_id in guests - pvch.guests:
+            self.add_guest(pvch, guest_id)
+        return True
+
+    def _discard_guest_index(self, guest_id: int, user_id: int):
+        owners: Optional[set[int]] = self._by_guest.get(guest_id)
+        if owners is not None:
+            owners.discard(user_id)
+            if not owners:
+                del self._by_guest[guest_id]
@@ -0,0 +1,463 @@
+from discord.utils import snowflake_time
+
+import csv
+import os
+import sqlite3
+import threading
+import time
+from loguru import logger
+from typing import Iterable, Optional
+
+from settings import (GUILD_ID, PVCH_STORAGE_BACKEND, PVCH_DATA_FILE_PATH, PVCH_JOURNAL_FILE_PATH, PVCH_JOURNAL_FSYNC, PVCH_JOURNAL_FSYNC_INTERVAL,
+                      PVCH_COMPACT_THRESHOLD, PVCH_SQLITE_PATH, PVCH_WRITE_BEHIND, PVCH_WRITE_BEHIND_WINDOW)
+
+
+Row = tuple[int, int, int, Optional[int]]  # (user_id, txt_channel_id, vc_channel_id, last_active_at)
+
+
+class PvchRecord:
+    """Persisted state of one private channel"""
+    __slots__ = ("user_id", "txt_channel_id", "vc_channel_id", "created_at", "last_active_at", "booster", "guests")
+
+    def __init__(self, user_id: int, txt_channel_id: int, vc_channel_id: int, created_at: Optional[float] = None,
+                 last_active_at: Optional[float] = None, booster: bool = False, guests: Optional[Iterable[int]] = None):
+        self.user_id: int = user_id
+        self.txt_channel_id: int = txt_channel_id
+        self.vc_channel_id: int = vc_channel_id
+        # The text channel id is a snowflake, so the creation time is always recoverable
+        self.created_at: float = created_at if created_at is not None else snowflake_time(txt_channel_id).timestamp()
+        self.last_active_at: float = last_active_at if last_active_at is not None else self.created_at
+        self.booster: bool = booster
+        self.guests: frozenset[int] = frozenset(guests or ())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PvchRecord):
+            return NotImplemented
+        return all(getattr(self, attr) == getattr(other, attr) for attr in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"PvchRecord(user_id={self.user_id}, txt_channel_id={self.txt_channel_id}, vc_channel_id={self.vc_channel_id})"
+
+
+class PvchStore:
+    """Storage backend interface for private channel records"""
+    indexed: bool = False  # Whether expired() is served by an index instead of loading every record
+
+    def load(self) -> dict[int, PvchRecord]:
+        """Load all records"""
+        raise NotImplementedError
+
+    def put(self, record: PvchRecord):
+        """Create or replace a record"""
+        raise NotImplementedError
+
+    def delete(self, user_id: int):
+        """Delete a record"""
+        raise NotImplementedError
+
+    def sync(self):
+        """Make preceding changes durable"""
+
+    def flush(self):
+        """Make preceding changes durable, blocking until they are written"""
+        self.sync()
+
+    def pending(self) -> int:
+        """Number of changes not written yet"""
+        return 0
+
+    def expired(self, inactive_before: float, inactive_sb_before: float) -> list[int]:
+        """List owners whose channels have been inactive since before the given timestamps"""
+        return [record.user_id for record in self.load().values()
+                if record.last_active_at <= (inactive_sb_before if record.booster else inactive_before)]
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def compact(self):
+        """Fold accumulated changes into a compact representation"""
+
+    def close(self):
+        pass
+
+
+class CsvJournalStore(PvchStore):
+    """Headerless CSV snapshot plus an append-only journal
+
+    The snapshot (PVCH_DATA_FILE_PATH) holds one `user_id,txt_channel_id,vc_channel_id[,last_active_at]` row per channel.
+    Changes made after the last compaction are appended to the journal (PVCH_JOURNAL_FILE_PATH)
+    as `C,user_id,txt_channel_id,vc_channel_id[,last_active_at]` or `D,user_id` records and replayed on load.
+    Booster and guest columns are not persisted by this backend. Every guild has its own pair of files (see partition_path()).
+    """
+    def __init__(self, data_path: str = PVCH_DATA_FILE_PATH, journal_path: str = PVCH_JOURNAL_FILE_PATH):
+        self.data_path: str = data_path
+        self.journal_path: str = journal_path
+        self._rows: dict[int, Row] = {}  # Persisted state {user_id: (user_id, txt_channel_id, vc_channel_id, last_active_at)}
+        self._journal_records: int = 0
+        self._journal = None
+        self._last_fsync: float = 0.0
+        self._lock: threading.Lock = threading.Lock()
+
+    def load(self) -> dict[int, PvchRecord]:
+        with self._lock:
+            self._rows = self._read_snapshot()
+            self._replay_journal()
+            return {user_id: PvchRecord(*row[:3], last_active_at=row[3]) for user_id, row in self._rows.items()}
+
+    def put(self, record: PvchRecord):
+        row: Row = (record.user_id, record.txt_channel_id, record.vc_channel_id, int(record.last_active_at))
+        with self._lock:
+            if self._rows.get(record.user_id) != row:
+                self._append(f"C,{row[0]},{row[1]},{row[2]},{row[3]}\n")
+                self._rows[record.user_id] = row
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._append(f"D,{user_id}\n")
+            self._rows.pop(user_id, None)
+
+    def sync(self):
+        """Flush the journal according to PVCH_JOURNAL_FSYNC"""
+        with self._lock:
+            if self._journal is None:
+                return
+            self._journal.flush()
+            now: float = time.monotonic()
+            if PVCH_JOURNAL_FSYNC == "always" or (PVCH_JOURNAL_FSYNC == "interval" and now - self._last_fsync >= PVCH_JOURNAL_FSYNC_INTERVAL):
+                os.fsync(self._journal.fileno())
+                self._last_fsync = now
+
+    def needs_compaction(self) -> bool:
+        return self._journal_records >= PVCH_COMPACT_THRESHOLD
+
+    def compact(self):
+        """Fold the journal into a new snapshot"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.data_path) or ".", exist_ok=True)
+            tmp_path: str = self.data_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for user_id, txt_ch_id, vc_ch_id, last_active_at in self._rows.values():
+                    if last_active_at is None:
+                        f.write(f"{user_id},{txt_ch_id},{vc_ch_id}\n")
+                    else:
+                        f.write(f"{user_id},{txt_ch_id},{vc_ch_id},{last_active_at}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.data_path)
+
+            # Records replayed onto the new snapshot are idempotent, so a crash before truncation is harmless
+            self._close_journal()
+            with open(self.journal_path, "w") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            logger.info(f"Compacted private channel data ({len(self._rows)} rows, {self._journal_records} journal records).")
+            self._journal_records = 0
+
+    def close(self):
+        with self._lock:
+            self._close_journal()
+
+    def _append(self, record: str):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._journal = open(self.journal_path, "a")
+        self._journal.write(record)
+        self._journal_records += 1
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            self._journal = None
+
+    def _read_snapshot(self) -> dict[int, Row]:
+        rows: dict[int, Row] = {}
+        try:
+            with open(self.data_path, "r") as f:
+                for data in csv.reader(f):
+                    if len(data) not in (3, 4):
+                        continue
+                    row: Row = self._row([int(d) for d in data])
+                    rows[row[0]] = row
+        except FileNotFoundError:
+            pass
+        return rows
+
+    def _replay_journal(self):
+        """Apply journal records, dropping a torn record left by a crash"""
+        self._close_journal()
+        self._journal_records = 0
+        valid_size: int = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    record: Optional[list[str]] = self._parse_record(line)
+                    if record is None:
+                        break
+                    if record[0] == "C":
+                        row: Row = self._row([int(d) for d in record[1:]])
+                        self._rows[row[0]] = row
+                    else:
+                        self._rows.pop(int(record[1]), None)
+                    self._journal_records += 1
+                    valid_size += len(line)
+                torn: bool = f.tell() != valid_size
+        except FileNotFoundError:
+            return
+
+        if torn:
+            logger.warning("Discarding a torn record at the end of the private channel journal.")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_size)
+
+    @staticmethod
+    def _row(data: list[int]) -> Row:
+        """Build a row from 3 columns (legacy, activity unknown) or 4 columns"""
+        return (data[0], data[1], data[2], data[3] if len(data) == 4 else None)
+
+    @staticmethod
+    def _parse_record(line: bytes) -> Optional[list[str]]:
+        if not line.endswith(b"\n"):
+            return None
+        record: list[str] = line.decode("ascii", errors="replace").strip().split(",")
+        if (record[0] == "C" and len(record) in (4, 5)) or (record[0] == "D" and len(record) == 2):
+            if all(d.isdigit() for d in record[1:]):
+                return record
+        return None
+
+
+class SqliteStore(PvchStore):
+    """SQLite backend (WAL mode) with activity, booster and guest columns
+
+    Every guild is a partition of the same tables, so processes serving different guilds can share one database.
+    """
+    indexed: bool = True
+    SCHEMA: str = """
+        CREATE TABLE IF NOT EXISTS pvch (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            txt_channel_id INTEGER NOT NULL,
+            vc_channel_id INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_active_at REAL NOT NULL,
+            booster INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pvch_txt_channel ON pvch (txt_channel_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pvch_vc_channel ON pvch (vc_channel_id);
+        CREATE INDEX IF NOT EXISTS idx_pvch_last_active ON pvch (guild_id, booster, last_active_at);
+        CREATE TABLE IF NOT EXISTS pvch_guest (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            guest_id INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, user_id, guest_id),
+            FOREIGN KEY (guild_id, user_id) REFERENCES pvch (guild_id, user_id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_pvch_guest ON pvch_guest (guild_id, guest_id)
+    """
+
+    def __init__(self, path: str = PVCH_SQLITE_PATH, guild_id: int = GUILD_ID):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path: str = path
+        self.guild_id: int = guild_id
+        self._lock: threading.Lock = threading.Lock()
+        self._conn: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("BEGIN IMMEDIATE")  # Other processes sharing the database wait for the schema
+        try:
+            columns: list[str] = [row[1] for row in self._conn.execute("PRAGMA table_info(pvch)")]
+            if len(columns) > 0 and "guild_id" not in columns:
+                self._migrate_single_guild()
+            for statement in self.SCHEMA.split(";"):
+                self._conn.execute(statement)
+            self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def load(self) -> dict[int, PvchRecord]:
+        with self._lock:
+            guests: dict[int, list[int]] = {}
+            for user_id, guest_id in self._conn.execute("SELECT user_id, guest_id FROM pvch_guest WHERE guild_id = ?", (self.guild_id,)):
+                guests.setdefault(user_id, []).append(guest_id)
+            rows = self._conn.execute("SELECT user_id, txt_channel_id, vc_channel_id, created_at, last_active_at, booster FROM pvch WHERE guild_id = ?",
+                                      (self.guild_id,)).fetchall()
+        return {row[0]: PvchRecord(*row[:5], booster=bool(row[5]), guests=guests.get(row[0])) for row in rows}
+
+    def put(self, record: PvchRecord):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("INSERT INTO pvch (guild_id, user_id, txt_channel_id, vc_channel_id, created_at, last_active_at, booster) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                                   "ON CONFLICT (guild_id, user_id) DO UPDATE SET txt_channel_id=excluded.txt_channel_id, vc_channel_id=excluded.vc_channel_id, "
+                                   "created_at=excluded.created_at, last_active_at=excluded.last_active_at, booster=excluded.booster",
+                                   (self.guild_id, record.user_id, record.txt_channel_id, record.vc_channel_id, record.created_at, record.last_active_at,
+                                    int(record.booster)))
+                self._conn.execute("DELETE FROM pvch_guest WHERE guild_id = ? AND user_id = ?", (self.guild_id, record.user_id))
+                self._conn.executemany("INSERT INTO pvch_guest (guild_id, user_id, guest_id) VALUES (?, ?, ?)",
+                                       [(self.guild_id, record.user_id, guest_id) for guest_id in record.guests])
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM pvch WHERE guild_id = ? AND user_id = ?", (self.guild_id, user_id))
+
+    def expired(self, inactive_before: float, inactive_sb_before: float) -> list[int]:
+        """Served from idx_pvch_last_active"""
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id FROM pvch WHERE guild_id = ? AND booster = 0 AND last_active_at <= ? "
+                                      "UNION ALL SELECT user_id FROM pvch WHERE guild_id = ? AND booster = 1 AND last_active_at <= ?",
+                                      (self.guild_id, inactive_before, self.guild_id, inactive_sb_before)).fetchall()
+        return [row[0] for row in rows]
+
+    def _migrate_single_guild(self):
+        """Move the tables of a database created before guild partitions into the partition of GUILD_ID"""
+        logger.info(f"Migrating {self.path} to per-guild partitions (guild_id={GUILD_ID}).")
+        for index in ("idx_pvch_txt_channel", "idx_pvch_vc_channel", "idx_pvch_last_active", "idx_pvch_guest"):
+            self._conn.execute(f"DROP INDEX IF EXISTS {index}")
+        self._conn.execute("ALTER TABLE pvch_guest RENAME TO pvch_guest_single")
+        self._conn.execute("ALTER TABLE pvch RENAME TO pvch_single")
+        for statement in self.SCHEMA.split(";"):
+            self._conn.execute(statement)
+        self._conn.execute("INSERT INTO pvch SELECT ?, user_id, txt_channel_id, vc_channel_id, created_at, last_active_at, booster FROM pvch_single",
+                           (GUILD_ID,))
+        self._conn.execute("INSERT INTO pvch_guest SELECT ?, user_id, guest_id FROM pvch_guest_single", (GUILD_ID,))
+        self._conn.execute("DROP TABLE pvch_guest_single")
+        self._conn.execute("DROP TABLE pvch_single")
+
+    def compact(self):
+        """Checkpoint the WAL into the main database file"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindStore(PvchStore):
+    """Queue changes in memory and write them to another store from a worker thread
+
+    Changes made within PVCH_WRITE_BEHIND_WINDOW seconds of each other are written as one batch,
+    and only the last change of each owner is kept, so a burst of deletions costs a single sync of the inner store.
+    """
+    def __init__(self, store: PvchStore, window: float = PVCH_WRITE_BEHIND_WINDOW):
+        self.store: PvchStore = store
+        self.window: float = window
+        self._pending: dict[int, Optional[PvchRecord]] = {}  # {user_id: record to put, None to delete}
+        self._lock: threading.Lock = threading.Lock()  # Guards _pending
+        self._flush_lock: threading.Lock = threading.Lock()  # Keeps batches in order
+        self._wakeup: threading.Event = threading.Event()
+        self._closed: bool = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def indexed(self) -> bool:
+        return self.store.indexed
+
+    def load(self) -> dict[int, PvchRecord]:
+        self.flush()
+        return self.store.load()
+
+    def put(self, record: PvchRecord):
+        with self._lock:
+            self._pending[record.user_id] = record
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._pending[user_id] = None
+
+    def sync(self):
+        """Schedule a flush, without waiting for it"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pvch-write-behind", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if len(batch) == 0:
+                return
+            try:
+                for user_id, record in batch.items():
+                    if record is None:
+                        self.store.delete(user_id)
+                    else:
+                        self.store.put(record)
+                self.store.sync()
+            except Exception:
+                with self._lock:
+                    for user_id, record in batch.items():
+                        self._pending.setdefault(user_id, record)  # Changes queued meanwhile are newer
+                raise
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def expired(self, inactive_before: float, inactive_sb_before: float) -> list[int]:
+        self.flush()
+        return self.store.expired(inactive_before, inactive_sb_before)
+
+    def needs_compaction(self) -> bool:
+        return self.store.needs_compaction()
+
+    def compact(self):
+        self.flush()
+        self.store.compact()
+
+    def close(self):
+        """Stop the worker and write everything still queued"""
+        self._closed = True
+        if self._thread is not None:
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.store.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait()
+            time.sleep(self.window)  # Let the burst accumulate
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write private channel data, retrying.")
+                time.sleep(max(self.window, 1.0))
+                self._wakeup.set()
+
+
+def store_settings() -> tuple:
+    """Settings an open store depends on, a reloaded cog keeps using the store while they are unchanged"""
+    return (PVCH_STORAGE_BACKEND, PVCH_DATA_FILE_PATH, PVCH_JOURNAL_FILE_PATH, PVCH_JOURNAL_FSYNC, PVCH_JOURNAL_FSYNC_INTERVAL,
+            PVCH_COMPACT_THRESHOLD, PVCH_SQLITE_PATH, PVCH_WRITE_BEHIND, PVCH_WRITE_BEHIND_WINDOW)
+
+def partition_path(path: str, guild_id: int) -> str:
+    """File of a guild's partition, `data/pvch_data.csv` becomes `data/pvch_data.<guild_id>.csv`
+
+    The guild of settings.GUILD_ID keeps the unsuffixed path, so single-guild data carries over.
+    """
+    if guild_id == GUILD_ID:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{guild_id}{ext}"
+
+def open_store(backend: str = PVCH_STORAGE_BACKEND, write_behind: bool = PVCH_WRITE_BEHIND, guild_id: int = GUILD_ID) -> PvchStore:
+    """Create the storage backend selected by PVCH_STORAGE_BACKEND for one guild"""
+    if backend == "csv":
+        store: PvchStore = CsvJournalStore(partition_path(PVCH_DATA_FILE_PATH, guild_id), partition_path(PVCH_JOURNAL_FILE_PATH, guild_id))
+    elif backend == "sqlite":
+        store: PvchStore = SqliteStore(PVCH_SQLITE_PATH, guild_id)
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return WriteBehindStore(store) if write_behind else store
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import discord
+from discord import CategoryChannel
+
+import asyncio
+import time
+from loguru import logger
+from typing import Callable
+
+from utils.pvch_registry import PvchRegistry
+from utils.pvch_store import PvchRecord
+from utils.rw_pvch_data import PvchDataCsv
+from utils.rest_queue import Priority, rest_queue
+
+
+class ReconcileReport:
+    """Result of a startup reconciliation pass"""
+    __slots__ = ("orphan_records", "orphan_channels", "deleted_channels", "failed", "duration")
+
+    def __init__(self):
+        self.orphan_records: list[PvchRecord] = []
+        self.orphan_channels: list[discord.abc.GuildChannel] = []
+        self.deleted_channels: int = 0
+        self.failed: int = 0
+        self.duration: float = 0.0
+
+    def __str__(self) -> str:
+        return (f"orphan_records={len(self.orphan_records)}, orphan_channels={len(self.orphan_channels)}, "
+                f"deleted_channels={self.deleted_channels}, failed={self.failed}, duration={self.duration:.3f}s")
+
+
+async def reconcile(pvch_data_csv: PvchDataCsv, registry: PvchRegistry, categories: list[CategoryChannel],
+                    is_pool_channel: Callable[[int], bool], delete_orphans: bool, concurrency: int) -> ReconcileReport:
+    """Drop records whose channels are gone, report (and optionally delete) channels without a record, then compact the store"""
+    report: ReconcileReport = ReconcileReport()
+    start: float = time.perf_counter()
+
+    report.orphan_records = list(pvch_data_csv.orphan_records)
+    for record in report.orphan_records:
+        logger.warning(f"Dropping private channel record without channels: {record}")
+    pvch_data_csv.update(registry)
+    pvch_data_csv.orphan_records = []
+
+    for category in categories:
+        for channel in category.channels:
+            if registry.get_by_channel(channel.id) is None and not is_pool_channel(channel.id):
+                report.orphan_channels.append(channel)
+    for channel in report.orphan_channels:
+        logger.warning(f"Private channel category contains a channel without a record: {channel.name} ({channel.id})")
+
+    if delete_orphans:
+        for i in range(0, len(report.orphan_channels), concurrency):
+            batch: list[discord.abc.GuildChannel] = report.orphan_channels[i:i + concurrency]
+            results: list = await asyncio.gather(*[rest_queue.delete(channel, Priority.MAINTENANCE) for channel in batch], return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    report.failed += 1
+                else:
+                    report.deleted_channels += 1
+
+    await asyncio.to_thread(pvch_data_csv.compact)
+    report.duration = time.perf_counter() - start
+    return report
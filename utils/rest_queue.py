@@ -0,0 +1,228 @@
+import discord
+
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from loguru import logger
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from utils.metrics import metrics
+
+from settings import REST_QUEUE_WORKERS, REST_QUEUE_BUCKET_CONCURRENCY, REST_QUEUE_CREATE_CONCURRENCY, REST_QUEUE_MAX_RETRIES, REST_QUEUE_RETRY_BACKOFF
+
+
+class Priority(enum.IntEnum):
+    USER = 0  # Interactive commands
+    MAINTENANCE = 1  # Expiry deletions, pool refill, reconciliation
+
+
+class PriorityStats:
+    """Counters of one priority level"""
+    __slots__ = ("depth", "completed", "failed", "retried", "coalesced", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.depth: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.retried: int = 0
+        self.coalesced: int = 0
+        self.wait_total: float = 0.0
+        self.wait_max: float = 0.0
+
+    def to_dict(self) -> dict[str, float]:
+        started: int = self.completed + self.failed
+        return {"depth": self.depth, "completed": self.completed, "failed": self.failed, "retried": self.retried, "coalesced": self.coalesced,
+                "wait_avg": self.wait_total / started if started > 0 else 0.0, "wait_max": self.wait_max}
+
+
+class _Job:
+    __slots__ = ("factory", "priority", "seq", "key", "bucket", "route", "future", "enqueued_at")
+
+    def __init__(self, factory: Callable[[], Awaitable[Any]], priority: Priority, seq: int, key: Optional[Hashable], bucket: Hashable, route: str):
+        self.factory: Callable[[], Awaitable[Any]] = factory
+        self.priority: Priority = priority
+        self.seq: int = seq  # Order among jobs of the same priority
+        self.key: Optional[Hashable] = key
+        self.bucket: Hashable = bucket
+        self.route: str = route
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at: float = time.perf_counter()
+
+    @property
+    def entry(self) -> tuple[Priority, int, '_Job']:
+        return self.priority, self.seq, self
+
+
+class RestQueue:
+    """Prioritized queue every Discord mutation goes through
+
+    Jobs with the same key that are still queued are merged into one request, transient
+    HTTP errors are retried with exponential backoff, and each bucket runs a limited number of jobs at once.
+    A job taken from the queue while its bucket is full is parked until a job of that bucket finishes,
+    so a busy bucket never holds the workers other buckets need.
+    """
+    def __init__(self, workers: int = REST_QUEUE_WORKERS, bucket_concurrency: int = REST_QUEUE_BUCKET_CONCURRENCY,
+                 create_concurrency: int = REST_QUEUE_CREATE_CONCURRENCY,
+                 max_retries: int = REST_QUEUE_MAX_RETRIES, retry_backoff: float = REST_QUEUE_RETRY_BACKOFF):
+        self.workers: int = workers
+        self.bucket_concurrency: int = bucket_concurrency
+        self.create_concurrency: int = create_concurrency  # Channel creation in a guild, one bucket for the whole guild
+        self.max_retries: int = max_retries
+        self.retry_backoff: float = retry_backoff
+        self.stats: dict[Priority, PriorityStats] = {priority: PriorityStats() for priority in Priority}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq: itertools.count = itertools.count()
+        self._pending: dict[Hashable, _Job] = {}  # {key: queued job}
+        self._running: dict[Hashable, int] = {}  # {bucket: jobs running}
+        self._parked: dict[Hashable, list[tuple[Priority, int, _Job]]] = {}  # {bucket: heap of queue entries waiting for the bucket}
+        self._tasks: list[asyncio.Task] = []
+        self._active: int = 0  # Jobs taken by a worker and not finished yet
+
+    @property
+    def busy(self) -> bool:
+        return self._active > 0 or any(stats.depth > 0 for stats in self.stats.values())
+
+    async def submit(self, factory: Callable[[], Awaitable[Any]], *, priority: Priority = Priority.USER,
+                     key: Optional[Hashable] = None, bucket: Hashable = None, route: str = "other") -> Any:
+        """Queue a request and wait for its result"""
+        self._ensure_started()
+        if key is not None and (job := self._pending.get(key)) is not None:
+            self.stats[priority].coalesced += 1
+            return await asyncio.shield(job.future)
+
+        job: _Job = _Job(factory, priority, next(self._seq), key, bucket, route)
+        if key is not None:
+            self._pending[key] = job
+        self.stats[priority].depth += 1
+        self._queue.put_nowait(job.entry)
+        return await asyncio.shield(job.future)
+
+    def delete(self, channel: discord.abc.GuildChannel, priority: Priority = Priority.USER) -> Awaitable[None]:
+        """Delete a channel, merging with a queued deletion of the same channel"""
+        return self.submit(channel.delete, priority=priority, key=("delete", channel.id), bucket=channel.id, route="channel.delete")
+
+    def edit(self, channel: discord.abc.GuildChannel, priority: Priority = Priority.USER, **options) -> Awaitable[Any]:
+        return self.submit(lambda: channel.edit(**options), priority=priority, bucket=channel.id, route="channel.edit")
+
+    def send(self, channel: discord.abc.Messageable, priority: Priority = Priority.USER, **options) -> Awaitable[discord.Message]:
+        return self.submit(lambda: channel.send(**options), priority=priority, bucket=channel.id, route="channel.send")
+
+    def pin(self, message: discord.Message, priority: Priority = Priority.USER) -> Awaitable[None]:
+        return self.submit(message.pin, priority=priority, bucket=message.channel.id, route="message.pin")
+
+    def create_text_channel(self, category: discord.CategoryChannel, priority: Priority = Priority.USER, **options) -> Awaitable[discord.TextChannel]:
+        return self.submit(lambda: category.create_text_channel(**options), priority=priority, bucket=("create", category.guild.id),
+                           route="guild.create_text_channel")
+
+    def create_voice_channel(self, category: discord.CategoryChannel, priority: Priority = Priority.USER, **options) -> Awaitable[discord.VoiceChannel]:
+        return self.submit(lambda: category.create_voice_channel(**options), priority=priority, bucket=("create", category.guild.id),
+                           route="guild.create_voice_channel")
+
+    def create_category(self, guild: discord.Guild, priority: Priority = Priority.USER, **options) -> Awaitable[discord.CategoryChannel]:
+        return self.submit(lambda: guild.create_category(**options), priority=priority, bucket=("create", guild.id), route="guild.create_category")
+
+    def stop(self):
+        """Stop the workers, cancelling queued and running jobs so that no caller waits forever"""
+        for task in self._tasks:
+            task.cancel()  # A running job's future is cancelled by its worker
+        self._tasks.clear()
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait()[2].future.cancel()
+        for parked in self._parked.values():
+            for _, _, job in parked:
+                job.future.cancel()
+        self._queue = None
+        self._pending.clear()
+        self._running.clear()
+        self._parked.clear()
+        for stats in self.stats.values():
+            stats.depth = 0
+
+    def stats_dict(self) -> dict[str, dict[str, float]]:
+        return {priority.name.lower(): stats.to_dict() for priority, stats in self.stats.items()}
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._tasks = [asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+
+    async def _worker(self, queue: asyncio.PriorityQueue):
+        # The queue is passed in, stop() replaces self._queue while cancelled workers are still unwinding
+        while True:
+            entry: tuple[Priority, int, _Job] = await queue.get()
+            job: _Job = entry[2]
+            if job.bucket is not None and self._running.get(job.bucket, 0) >= self._limit(job.bucket):
+                heapq.heappush(self._parked.setdefault(job.bucket, []), entry)  # Requeued by _release_bucket()
+                queue.task_done()
+                continue
+            self._active += 1
+            if job.key is not None:
+                self._pending.pop(job.key, None)
+            stats: PriorityStats = self.stats[job.priority]
+            stats.depth -= 1
+            wait: float = time.perf_counter() - job.enqueued_at
+            stats.wait_total += wait
+            stats.wait_max = max(stats.wait_max, wait)
+
+            if job.bucket is not None:
+                self._running[job.bucket] = self._running.get(job.bucket, 0) + 1
+            try:
+                await self._run(job, stats)
+            finally:
+                if not job.future.done():  # Cancelled by stop()
+                    job.future.cancel()
+                if job.bucket is not None and queue is self._queue:  # Not stopped meanwhile
+                    self._release_bucket(job.bucket, queue)
+                self._active -= 1
+                queue.task_done()
+
+    async def _run(self, job: _Job, stats: PriorityStats):
+        for attempt in itertools.count():
+            start: float = time.perf_counter()
+            try:
+                result: Any = await job.factory()
+            except discord.HTTPException as e:
+                metrics.observe("pvch_rest_request_seconds", time.perf_counter() - start, route=job.route)
+                if (e.status >= 500 or e.status == 429) and attempt < self.max_retries:
+                    metrics.inc("pvch_rest_requests_total", route=job.route, outcome="retry")
+                    stats.retried += 1
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+                metrics.inc("pvch_rest_requests_total", route=job.route, outcome="error")
+                stats.failed += 1
+                logger.warning(f"REST request failed ({job.route}): {e.status} {e.text}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            except Exception as e:
+                metrics.inc("pvch_rest_requests_total", route=job.route, outcome="error")
+                stats.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            metrics.observe("pvch_rest_request_seconds", time.perf_counter() - start, route=job.route)
+            metrics.inc("pvch_rest_requests_total", route=job.route, outcome="success")
+            stats.completed += 1
+            if not job.future.done():
+                job.future.set_result(result)
+            return
+
+    def _limit(self, bucket: Hashable) -> int:
+        return self.create_concurrency if isinstance(bucket, tuple) and bucket[0] == "create" else self.bucket_concurrency
+
+    def _release_bucket(self, bucket: Hashable, queue: asyncio.PriorityQueue):
+        """Requeue the next parked job of the bucket, dropping idle buckets so the maps do not grow with every channel"""
+        if (running := self._running[bucket] - 1) > 0:
+            self._running[bucket] = running
+        else:
+            del self._running[bucket]
+        if (parked := self._parked.get(bucket)) is not None:
+            queue.put_nowait(heapq.heappop(parked))
+            if len(parked) == 0:
+                del self._parked[bucket]
+
+
+rest_queue: RestQueue = RestQueue()
@@ -1,55 +1,127 @@
 from __future__ import annotations
+import discord
 from discord import CategoryChannel, TextChannel, VoiceChannel
 
-import csv
+from typing import Optional
 
 from Cogs import private_channel
+from utils.pvch_registry import PvchRegistry
+from utils.pvch_store import PvchRecord, PvchStore, open_store
 
-from settings import PVCH_DATA_FILE_PATH
 
 class PvchDataCsv:
-    def __init__(self):
-        self.category: CategoryChannel = None
+    """Private channel data persistence on top of a pluggable PvchStore backend"""
+    def __init__(self, store: Optional[PvchStore] = None):
+        self.categories: list[CategoryChannel] = []
+        self.store: PvchStore = store if store is not None else open_store()
+        self._records: dict[int, PvchRecord] = {}  # Persisted state {user_id: PvchRecord}
+        self.orphan_records: list[PvchRecord] = []  # Records of the last read whose channels no longer exist
 
     def write(self, pvch: 'private_channel.PrivateChannel'):
-        """Write private channel data to csv file"""
-        row: str = f"{pvch.user_id},{pvch.txt_channel.id},{pvch.vc_channel.id}\n"
-        with open(PVCH_DATA_FILE_PATH, "a") as f:
-            f.write(row)
-
-    def read(self, category: CategoryChannel) -> dict[int, 'private_channel.PrivateChannel']:
-        """Read private channel data from csv file"""
-        self.category = category
-        raw_data: list[str] = []
-        with open(PVCH_DATA_FILE_PATH, "r") as f:
-            reader = csv.reader(f)
-            raw_data = list(reader)
-        return self._parse(raw_data)
-
-    def update(self, pvch_data: dict[int, 'private_channel.PrivateChannel']):
-        """Update(Delete) private channel data in csv file"""
-        with open(PVCH_DATA_FILE_PATH, "w") as f:
-            for pvch in pvch_data.values():
-                row: str = f"{pvch.user_id},{pvch.txt_channel.id},{pvch.vc_channel.id}\n"
-                f.write(row)
-
-    def _parse(self, raw_data: list[str]) -> dict[int, 'private_channel.PrivateChannel']:
-        """Parse CSV raw data into praivate channel data"""
+        """Write (create or replace) private channel data"""
+        self._put(self._record(pvch))
+        self.store.sync()
+
+    def read(self, categories: list[CategoryChannel]) -> dict[int, 'private_channel.PrivateChannel']:
+        """Read private channel data from the store, resolving channels across all managed categories"""
+        self.categories = categories
+        self._records = self.store.load()
+        return self._parse(list(self._records.values()))
+
+    def adopt(self, records: list[PvchRecord], categories: list[CategoryChannel]):
+        """Take over records already persisted by another facade of the same data, without reading the store"""
+        self.categories = categories
+        self._records = {record.user_id: record for record in records}
+
+    def update(self, pvch_data: dict[int, 'private_channel.PrivateChannel'] | PvchRegistry):
+        """Update(Delete) private channel data by persisting the difference
+
+        Compares every record, meant for bulk reconciliation; a single channel is dropped with `delete()`.
+        """
+        for user_id in self._records.keys() - pvch_data.keys():
+            self.store.delete(user_id)
+            del self._records[user_id]
+        for user_id in pvch_data.keys() - self._records.keys():
+            self._put(self._record(pvch_data.get(user_id)))
+        self.store.sync()
+
+    def delete(self, user_id: int):
+        """Delete private channel data"""
+        if self._records.pop(user_id, None) is not None:
+            self.store.delete(user_id)
+            self.store.sync()
+
+    def get(self, user_id: int) -> Optional[PvchRecord]:
+        return self._records.get(user_id)
+
+    def records(self) -> list[PvchRecord]:
+        return list(self._records.values())
+
+    def touch(self, user_id: int, last_active_at: float):
+        """Persist the last activity time of a private channel"""
+        prev: Optional[PvchRecord] = self._records.get(user_id)
+        if prev is None:
+            return
+        self._put(PvchRecord(prev.user_id, prev.txt_channel_id, prev.vc_channel_id, prev.created_at, last_active_at, prev.booster, prev.guests))
+        self.store.sync()
+
+    def set_booster(self, user_id: int, booster: bool):
+        """Persist the owner's Server Booster status"""
+        prev: Optional[PvchRecord] = self._records.get(user_id)
+        if prev is None or prev.booster == booster:
+            return
+        self._put(PvchRecord(prev.user_id, prev.txt_channel_id, prev.vc_channel_id, prev.created_at, prev.last_active_at, booster, prev.guests))
+        self.store.sync()
+
+    def expired(self, inactive_before: float, inactive_sb_before: float) -> list[int]:
+        """List owners whose channels have been inactive since before the given timestamps
+
+        Without an index in the store, the records held in memory are scanned; they also carry the booster state
+        set since startup, which the CSV backend does not persist.
+        """
+        if self.store.indexed:
+            return self.store.expired(inactive_before, inactive_sb_before)
+        return [record.user_id for record in list(self._records.values())  # Copied at once, may run in a thread
+                if record.last_active_at <= (inactive_sb_before if record.booster else inactive_before)]
+
+    def flush(self):
+        """Block until every change is written"""
+        self.store.flush()
+
+    def pending_writes(self) -> int:
+        return self.store.pending()
+
+    def needs_compaction(self) -> bool:
+        return self.store.needs_compaction()
+
+    def compact(self):
+        self.store.compact()
+
+    def close(self):
+        self.store.close()
+
+    def _put(self, record: PvchRecord):
+        if self._records.get(record.user_id) != record:
+            self.store.put(record)
+            self._records[record.user_id] = record
+
+    def _record(self, pvch: 'private_channel.PrivateChannel') -> PvchRecord:
+        """Build a record from a private channel, keeping stored activity and booster state"""
+        prev: Optional[PvchRecord] = self._records.get(pvch.user_id)
+        if prev is not None and prev.txt_channel_id == pvch.txt_channel.id:
+            return PvchRecord(pvch.user_id, pvch.txt_channel.id, pvch.vc_channel.id, prev.created_at, prev.last_active_at, prev.booster, pvch.guests)
+        return PvchRecord(pvch.user_id, pvch.txt_channel.id, pvch.vc_channel.id, guests=pvch.guests)
+
+    def _parse(self, raw_data: list[PvchRecord]) -> dict[int, 'private_channel.PrivateChannel']:
+        """Parse stored records into praivate channel data, collecting records whose channels are gone"""
+        channels: dict[int, discord.abc.GuildChannel] = {ch.id: ch for category in self.categories for ch in category.channels}
         pvch_data: dict[int, 'private_channel.PrivateChannel'] = {}
+        self.orphan_records = []
         for data in raw_data:
-            user_id, txt_ch_id, vc_ch_id = [int(d) for d in data]
-
-            txt_ch: TextChannel = None
-            for ch in self.category.text_channels:
-                if ch.id == txt_ch_id:
-                    txt_ch = ch
-                    break
-
-            vc_ch: VoiceChannel = None
-            for ch in self.category.voice_channels:
-                if ch.id == vc_ch_id:
-                    vc_ch = ch
-                    break
-            if txt_ch is not None and vc_ch is not None:
-                pvch_data[user_id] = private_channel.PrivateChannel(user_id, txt_ch, vc_ch)
-        return pvch_data
\ No newline at end of file
+            txt_ch: Optional[discord.abc.GuildChannel] = channels.get(data.txt_channel_id)
+            vc_ch: Optional[discord.abc.GuildChannel] = channels.get(data.vc_channel_id)
+            if isinstance(txt_ch, TextChannel) and isinstance(vc_ch, VoiceChannel):
+                pvch_data[data.user_id] = private_channel.PrivateChannel(data.user_id, txt_ch, vc_ch)
+            else:
+                self.orphan_records.append(data)
+        return pvch_data